@@ -0,0 +1,239 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.fast_serializers import aserialize_recipe_rows, recipe_rows
+from recipes.catalog import get_catalog_state
+from recipes.ingredient_index import search_ingredients
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.recipe_index import RankedRecipes
+from recipes.shopping_list import (arender, get_shopping_list,
+                                   shopping_list_cache_key)
+from recipes.views import SHOPPING_LIST_CACHE_TIMEOUT, RecipeViewSet
+from utils.filters import RecipeFilter
+from utils.mixins import anonymous_list_cache_key
+from utils.paginations import COUNT_CACHE_TIMEOUT, CustomPagination
+from utils.renderers import CSVRenderer, PlainTextRenderer
+
+TAG_FIELDS = ('id', 'name', 'slug', 'color')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def async_read(handler, sync_view, negotiate=False, authenticate=True):
+    """Serve GET requests with ``handler``, everything else with DRF.
+
+    The handler gets an authenticated DRF request and returns a response,
+    or ``None`` to hand the request over to ``sync_view``. Writes,
+    browsable API pages, ``?format=`` and every error go that way, so
+    their behaviour stays exactly the one of the router views.
+    """
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET' and (negotiate or wants_json(request)):
+            drf_request = Request(
+                request,
+                authenticators=[TokenAuthentication()] if authenticate else [])
+            try:
+                await sync_to_async(getattr)(drf_request, 'user')
+                response = await handler(drf_request, *args, **kwargs)
+            except APIException:
+                response = None
+            if response is not None:
+                return response
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    # csrf_exempt() only learns to wrap coroutines in Django 5.0.
+    view.csrf_exempt = True
+    return view
+
+
+def wants_json(request):
+    return ('format' not in request.GET
+            and 'text/html' not in request.headers.get('Accept', ''))
+
+
+def json_response(data):
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type='application/json')
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def catalog_response(request, model, get_data):
+    version, modified = await sync_to_async(get_catalog_state)(model)
+    etag = quote_etag(f'{model._meta.label_lower}-{version}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified)
+    if response is None:
+        data = await get_data()
+        if data is None:
+            return None
+        response = json_response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    return response
+
+
+async def tag_list(request):
+    return await catalog_response(
+        request, Tag,
+        lambda: aslist(Tag.objects.values(*TAG_FIELDS)))
+
+
+async def tag_detail(request, pk):
+    return await catalog_response(
+        request, Tag,
+        lambda: Tag.objects.values(*TAG_FIELDS).filter(pk=pk).afirst())
+
+
+async def ingredient_list(request):
+    name = request.query_params.get('name')
+    if name is None:
+        return await catalog_response(
+            request, Ingredient,
+            lambda: aslist(Ingredient.objects.values(*INGREDIENT_FIELDS)))
+
+    limit = request.query_params.get('limit', '')
+    limit = int(limit) if limit.isdigit() else None
+    return await catalog_response(
+        request, Ingredient,
+        lambda: sync_to_async(search_ingredients)(name, limit=limit))
+
+
+async def ingredient_detail(request, pk):
+    return await catalog_response(
+        request, Ingredient,
+        lambda: Ingredient.objects.values(
+            *INGREDIENT_FIELDS).filter(pk=pk).afirst())
+
+
+async def recipe_list(request):
+    paginator = CustomPagination()
+    if paginator.cursor_query_param in request.query_params:
+        return None
+
+    cache_key = None
+    if not request.user.is_authenticated:
+        # Shared with the router view, whose output is the same.
+        cache_key = await sync_to_async(anonymous_list_cache_key)(
+            request, RecipeViewSet.list_generation_key)
+        data = await cache.aget(cache_key)
+        if data is not None:
+            return json_response(data)
+
+    filterset = RecipeFilter(
+        data=request.query_params,
+        queryset=Recipe.objects.with_user_flags(request.user),
+        request=request,
+        rank_in_memory='ordering' not in request.query_params)
+    queryset = await sync_to_async(
+        lambda: filterset.ranked_qs if filterset.is_valid() else None)()
+    page_size = paginator.get_page_size(request)
+    page_number = request.query_params.get(paginator.page_query_param, '1')
+    if queryset is None or not page_number.isdigit():
+        return None
+
+    rows = recipe_rows(queryset, request.user)
+    count, is_estimate = await count_recipes(paginator, request, rows)
+
+    page_number = int(page_number)
+    last_page = max(math.ceil(count / page_size), 1)
+    if not 1 <= page_number <= last_page:
+        return None
+    offset = (page_number - 1) * page_size
+    rows = await aslist(rows[offset:offset + page_size])
+
+    url = request.build_absolute_uri()
+    previous = None
+    if page_number == 2:
+        previous = remove_query_param(url, paginator.page_query_param)
+    elif page_number > 2:
+        previous = replace_query_param(
+            url, paginator.page_query_param, page_number - 1)
+    data = {
+        'count': count,
+        'is_estimate': is_estimate,
+        'next': replace_query_param(
+            url, paginator.page_query_param, page_number + 1)
+        if page_number < last_page else None,
+        'previous': previous,
+        'results': await aserialize_recipe_rows(rows, request),
+    }
+    if cache_key is not None:
+        await cache.aset(
+            cache_key, data, RecipeViewSet.list_cache_timeout)
+    return json_response(data)
+
+
+async def count_recipes(paginator, request, queryset):
+    """Async counterpart of ``CustomPagination.count_objects``."""
+    if isinstance(queryset, RankedRecipes):
+        return await sync_to_async(len)(queryset), False
+    if request.query_params.get(paginator.exact_count_query_param) == '1':
+        return await queryset.acount(), False
+
+    key = paginator.count_cache_key(request)
+    count = await cache.aget(key)
+    if count is not None:
+        return count, True
+    count = await sync_to_async(paginator.estimate_table_size)(queryset)
+    is_estimate = count is not None
+    if not is_estimate:
+        count = await queryset.acount()
+    await cache.aset(key, count, COUNT_CACHE_TIMEOUT)
+    return count, is_estimate
+
+
+async def recipe_detail(request, pk):
+    row = await recipe_rows(
+        Recipe.objects.with_user_flags(request.user), request.user,
+    ).filter(pk=pk).afirst()
+    if row is None:
+        return None
+    return json_response((await aserialize_recipe_rows([row], request))[0])
+
+
+async def download_shopping_cart(request):
+    if not request.user.is_authenticated:
+        return None
+    renderer, _ = DefaultContentNegotiation().select_renderer(
+        request, [PlainTextRenderer(), CSVRenderer(), JSONRenderer()])
+    file_format = renderer.format
+    cache_key = await sync_to_async(shopping_list_cache_key)(
+        request.user.id, file_format)
+    content_type = f'{renderer.media_type}; charset=utf-8'
+
+    rendered = await cache.aget(cache_key)
+    if rendered is not None:
+        response = HttpResponse(rendered, content_type=content_type)
+    else:
+        chunks = arender(
+            file_format, get_shopping_list(request.user).aiterator())
+        response = StreamingHttpResponse(
+            acache_chunks(chunks, cache_key, SHOPPING_LIST_CACHE_TIMEOUT),
+            content_type=content_type)
+
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping_list.{file_format}')
+    return response
+
+
+async def aslist(queryset):
+    return [row async for row in queryset]
+
+
+async def acache_chunks(chunks, key, timeout):
+    rendered = []
+    async for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    await cache.aset(key, ''.join(rendered), timeout)
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from api.serializers import represent_renditions
+from recipes.models import IngredientAmount, Tag
+
+RECIPE_ROW_FIELDS = (
+    'id', 'name', 'text', 'image', 'renditions', 'cooking_time',
+    'pub_date', 'author_id', 'author__email', 'author__username',
+    'author__first_name', 'author__last_name')
+RECIPE_FLAG_FIELDS = (
+    'is_favorited', 'is_in_shopping_cart', 'author_is_subscribed')
+
+
+def recipe_rows(queryset, user):
+    """Narrow an annotated recipe queryset to plain ``.values()`` rows."""
+    fields = RECIPE_ROW_FIELDS
+    if user.is_authenticated:
+        fields += RECIPE_FLAG_FIELDS
+    return queryset.values(*fields)
+
+
+def related_rows(recipe_ids):
+    """Tag and ingredient amount rows of a page, one query each."""
+    return (
+        Tag.objects.filter(recipes__in=recipe_ids).values_list(
+            'recipes', 'id', 'name', 'slug', 'color'),
+        IngredientAmount.objects.filter(recipe_id__in=recipe_ids).values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'),
+    )
+
+
+def serialize_recipe_rows(rows, request):
+    """Build ``RecipeListSerializer`` output from ``recipe_rows``.
+
+    Tags and ingredient amounts come from one batched query each and
+    are stitched in with plain dicts, skipping DRF field machinery.
+    The output must stay identical to the serializer's.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    tag_rows, ingredient_rows = related_rows([row['id'] for row in rows])
+    return build_recipes(rows, tag_rows, ingredient_rows, request)
+
+
+async def aserialize_recipe_rows(rows, request):
+    if not rows:
+        return []
+    tag_rows, ingredient_rows = related_rows([row['id'] for row in rows])
+    return build_recipes(
+        rows,
+        [row async for row in tag_rows],
+        [row async for row in ingredient_rows],
+        request)
+
+
+def build_recipes(rows, tag_rows, ingredient_rows, request):
+    build_url = request.build_absolute_uri
+
+    tags = defaultdict(list)
+    for recipe_id, *values in tag_rows:
+        tags[recipe_id].append(dict(zip(
+            ('id', 'name', 'slug', 'color'), values)))
+
+    ingredients = defaultdict(list)
+    for recipe_id, *values in ingredient_rows:
+        ingredients[recipe_id].append(dict(zip(
+            ('id', 'name', 'measurement_unit', 'amount'), values)))
+
+    return [{
+        'id': row['id'],
+        'name': row['name'],
+        'text': row['text'],
+        'author': {
+            'id': row['author_id'],
+            'email': row['author__email'],
+            'username': row['author__username'],
+            'first_name': row['author__first_name'],
+            'last_name': row['author__last_name'],
+            'is_subscribed': row.get('author_is_subscribed', False),
+        },
+        'image': (build_url(default_storage.url(row['image']))
+                  if row['image'] else None),
+        'images': represent_renditions(
+            row['image'], row['renditions'], build_url),
+        'tags': tags[row['id']],
+        'ingredients': ingredients[row['id']],
+        'cooking_time': row['cooking_time'],
+        'is_favorited': row.get('is_favorited', False),
+        'is_in_shopping_cart': row.get('is_in_shopping_cart', False),
+    } for row in rows]
@@ -1,12 +1,83 @@
+import base64
+import binascii
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
+from rest_framework.settings import api_settings
 
+from recipes.fragments import FRAGMENT_TIMEOUT, fragment_keys
+from recipes.images import RENDITION_SIZES
 from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, Tag, recipe_card_prefetches)
+from recipes.shopping_list import lock_recipe_carts, recipe_amounts_changed
+from recipes.signals import recipe_ingredients_changed
 from users.models import Subscription, User
 
 MIN_VALUE = 1
 MAX_VALUE = 32000
+MAX_BULK_RECIPES = 500
+
+
+def represent_renditions(image_name, renditions, build_url):
+    if not image_name:
+        return None
+    if renditions.get('source') != image_name:
+        original = build_url(default_storage.url(image_name))
+        return {size: {'webp': original, 'jpeg': original}
+                for size in RENDITION_SIZES}
+    return {
+        size: {extension: build_url(default_storage.url(name))
+               for extension, name in formats.items()}
+        for size, formats in renditions['sizes'].items()}
+
+
+class RecipeImageField(Base64ImageField):
+    """Base64 image that keeps the stored file when it is sent unchanged.
+
+    Editing a recipe resends its picture; returning the current file
+    skips verifying the image again, writing a copy and rendering new
+    renditions for it.
+    """
+
+    def to_internal_value(self, data):
+        current = getattr(self.parent.instance, 'image', None)
+        if current and isinstance(data, str) and is_same_file(
+                current, data.split(';base64,')[-1]):
+            return current
+        return super().to_internal_value(data)
+
+
+def is_same_file(file, base64_data):
+    try:
+        content = base64.b64decode(base64_data)
+        if file.size != len(content):
+            return False
+        with file.storage.open(file.name, 'rb') as stored:
+            return stored.read() == content
+    except (binascii.Error, ValueError, OSError):
+        return False
+
+
+class ImageRenditionsField(serializers.Field):
+    """URLs of the resized recipe images per size and format.
+
+    Every entry points at the original upload until the background
+    renditions for the current image exist.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return represent_renditions(
+            recipe.image.name, recipe.renditions,
+            self.context['request'].build_absolute_uri)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -64,15 +135,17 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        if user.is_authenticated:
-            return user.followed_users.filter(author=obj).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return user.followed_users.filter(author=obj).exists()
 
 
 class SubscriberSerializer(CustomUserSerializer):
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = ('id',
@@ -104,11 +177,14 @@ class SubscriberSerializer(CustomUserSerializer):
         return data
 
     def get_recipes(self, obj):
-        queryset = obj.recipes.all()
-        recipes_limit = self.context['request'].GET.get('recipes_limit')
+        if hasattr(obj, 'latest_recipes'):
+            queryset = obj.latest_recipes
+        else:
+            queryset = obj.recipes.all()
+            recipes_limit = self.context['request'].GET.get('recipes_limit')
 
-        if recipes_limit and recipes_limit.isdigit():
-            queryset = queryset[: int(recipes_limit)]
+            if recipes_limit and recipes_limit.isdigit():
+                queryset = queryset[: int(recipes_limit)]
 
         recipes = BriefRecipeSerializer(
             queryset, many=True,
@@ -118,28 +194,36 @@ class SubscriberSerializer(CustomUserSerializer):
 
 
 class CreateSubscribtionSerializer(serializers.ModelSerializer):
+    """Subscribe the current user to the author passed in the context.
+
+    The view has already loaded the author, and a repeated subscription
+    is caught by the unique constraint instead of a lookup.
+    """
+
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
         model = Subscription
-        fields = ('user', 'author')
+        fields = ('user',)
 
     def validate(self, data):
-        user = data['user']
-        author = data['author']
-
-        if user.followed_users.filter(author=author.id).exists():
-            raise serializers.ValidationError(
-                detail='already subscribed',
-                code=status.HTTP_400_BAD_REQUEST)
-
-        if user == author:
+        if data['user'] == self.context['author']:
             raise serializers.ValidationError(
                 detail='can\'t subscribe to yourself',
                 code=status.HTTP_400_BAD_REQUEST)
-
         return data
 
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return Subscription.objects.create(
+                    author=self.context['author'], **validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['already subscribed']})
+
     def to_representation(self, instance):
+        instance.author.is_subscribed = True
         return SubscriberSerializer(
             instance=instance.author,
             context=self.context).data
@@ -148,25 +232,30 @@ class CreateSubscribtionSerializer(serializers.ModelSerializer):
 class BriefRecipeSerializer(serializers.ModelSerializer):
 
     image = Base64ImageField()
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'images')
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class UserRecipeRelationSerializer(serializers.ModelSerializer):
+    """Base for favorite and shopping cart relations.
 
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
+    Duplicates are left to the unique constraint: the insert runs in a
+    savepoint and a conflict is reported as the usual validation error.
+    """
 
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    duplicate_message = None
 
-        if user.recipes_favorite_related.filter(recipe=recipe.id).exists():
-            raise serializers.ValidationError('Recipe already in favorite')
-        return data
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]})
 
     def to_representation(self, instance):
         serializer = BriefRecipeSerializer(
@@ -174,30 +263,78 @@ class FavoriteSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(UserRecipeRelationSerializer):
+
+    duplicate_message = 'Recipe already in favorite'
+
+    class Meta:
+        model = Favorite
+        fields = ('user', 'recipe')
+
+
+class ShoppingCartSerializer(UserRecipeRelationSerializer):
+
+    duplicate_message = 'Recipe already in cart'
 
     class Meta:
         model = ShoppingCart
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
 
-        if user.recipes_shoppingcart_related.filter(recipe=recipe.id).exists():
-            raise serializers.ValidationError('Recipe already in cart')
-        return data
+class RecipeIdsSerializer(serializers.Serializer):
 
-    def to_representation(self, instance):
-        serializer = BriefRecipeSerializer(
-            instance.recipe, context=self.context)
-        return serializer.data
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES)
+
+    def validate_recipes(self, value):
+        recipe_ids = set(value)
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        missing = sorted(recipe_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                f'No such recipes: {", ".join(map(str, missing))}')
+        return sorted(recipe_ids)
+
+
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    """Reuse the viewer independent part of every recipe on a page.
+
+    Cached fragments are fetched with one ``get_many``; only the missing
+    recipes get their relations prefetched and are serialized, and the
+    viewer booleans are laid over every entry afterwards.
+    """
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        keys = fragment_keys(
+            recipes, self.context['request'].build_absolute_uri('/'))
+        fragments = cache.get_many(keys)
+
+        missing = [
+            recipe for recipe, key in zip(recipes, keys)
+            if key not in fragments]
+        if missing:
+            prefetch_related_objects(missing, *recipe_card_prefetches())
+            rendered = {
+                key: self.child.to_representation(recipe)
+                for recipe, key in zip(recipes, keys)
+                if key not in fragments}
+            cache.set_many(rendered, FRAGMENT_TIMEOUT)
+            fragments.update(rendered)
+
+        return [
+            self.child.overlay_viewer_flags(fragments[key], recipe)
+            for recipe, key in zip(recipes, keys)]
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
 
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
+    images = ImageRenditionsField()
     tags = TagSerializer(many=True, read_only=True)
     ingredients = IngredientAmountSerializer(
         many=True,
@@ -212,31 +349,52 @@ class RecipeListSerializer(serializers.ModelSerializer):
                   'text',
                   'author',
                   'image',
+                  'images',
                   'tags',
                   'ingredients',
                   'cooking_time',
                   'is_favorited',
                   'is_in_shopping_cart')
+        list_serializer_class = CachedRecipeListSerializer
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def overlay_viewer_flags(self, representation, instance):
+        author = dict(representation['author'])
+        author['is_subscribed'] = bool(
+            self.context['request'].user.is_authenticated
+            and getattr(instance, 'author_is_subscribed', False))
+        representation = dict(representation)
+        representation['author'] = author
+        representation['is_favorited'] = self.get_is_favorited(instance)
+        representation['is_in_shopping_cart'] = (
+            self.get_is_in_shopping_cart(instance))
+        return representation
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
-        if user.is_authenticated:
-            return getattr(user, 'recipes_favorite_related'
-                           ).filter(recipe=obj).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return user.recipes_favorite_related.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
-        if user.is_authenticated:
-            return getattr(user, 'recipes_shoppingcart_related'
-                           ).filter(recipe=obj).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return user.recipes_shoppingcart_related.filter(recipe=obj).exists()
 
 
 class RecipeSerializer(serializers.ModelSerializer):
 
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     cooking_time = serializers.IntegerField(
         min_value=MIN_VALUE,
         max_value=MAX_VALUE,
@@ -298,22 +456,83 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient in ingredients]
         IngredientAmount.objects.bulk_create(create_ingredients)
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Write only the amounts that were added, changed or removed.
+
+        Returns the change of each added or changed amount; removed rows
+        are taken off shopping lists by their delete signals.
+        """
+        # Read past any prefetched rows, after the caller's locks.
+        current = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmount.objects.filter(recipe=recipe)}
+        wanted = {item['id'].id: item['amount'] for item in ingredients}
+
+        removed = current.keys() - wanted.keys()
+        added = [
+            IngredientAmount(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in wanted.items()
+            if ingredient_id not in current]
+        changes = {amount.ingredient_id: amount.amount for amount in added}
+        changed = []
+        for ingredient_id, amount in wanted.items():
+            if ingredient_id in current:
+                if current[ingredient_id].amount != amount:
+                    changes[ingredient_id] = (
+                        amount - current[ingredient_id].amount)
+                    current[ingredient_id].amount = amount
+                    changed.append(current[ingredient_id])
+
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        if added:
+            IngredientAmount.objects.bulk_create(added)
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ('amount',))
+        return changes
+
+    @staticmethod
+    def update_tags(recipe, tags):
+        # Read past any prefetched tags, after the caller's locks.
+        current = set(recipe.tags.values_list('id', flat=True))
+        wanted = {tag.id for tag in tags}
+        if current - wanted:
+            recipe.tags.remove(*(current - wanted))
+        if wanted - current:
+            recipe.tags.add(*(wanted - current))
+
     def create(self, validated_data):
         user = self.context['request'].user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data, author=user)
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data, author=user)
+            recipe.tags.set(tags)
+            self.create_ingredients(recipe, ingredients)
         return recipe
 
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(validated_data.pop('tags'))
-        self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            cart_users = lock_recipe_carts(instance.pk)
+            self.update_tags(instance, validated_data.pop('tags'))
+            ingredients_changed = self.update_ingredients(
+                instance, validated_data.pop('ingredients'))
+            # The bulk writes send no signals to keep lists in step.
+            recipe_amounts_changed(cart_users, ingredients_changed)
+            changed = [
+                field for field, value in validated_data.items()
+                if getattr(instance, field) != value]
+            for field in changed:
+                setattr(instance, field, validated_data[field])
+            if changed:
+                instance.save(update_fields=changed)
+            # Tag changes send m2m_changed, bulk amount writes nothing.
+            if ingredients_changed:
+                recipe_ingredients_changed([instance.pk])
+        return instance
 
     def to_representation(self, recipe):
         return RecipeListSerializer(recipe, context=self.context).data
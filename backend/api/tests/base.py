@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+
+def make_png(color=(0, 0, 0, 0)):
+    """A 1x1 PNG that Pillow can decode, so renditions can be built."""
+    output = BytesIO()
+    Image.new('RGBA', (1, 1), color).save(output, 'PNG')
+    return output.getvalue()
+
+
+PNG = make_png()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeDataTestCase(TestCase):
+    """Two authors with two recipes each, and a reader following both.
+
+    Every recipe has two tags and three ingredients; the reader has two
+    recipes in favorites and two in the cart. Query counts are those of
+    PostgreSQL, the database the settings configure.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}', email=f'author{number}@ya.ru',
+                first_name='Author', last_name=str(number),
+                password='password')
+            for number in range(2)]
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@ya.ru', first_name='Reader',
+            last_name='Reader', password='password')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Tag {number}', slug=f'tag{number}',
+                color=f'#00000{number}')
+            for number in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ingredient {number}', measurement_unit='g')
+            for number in range(5)]
+
+        cls.recipes = []
+        for number in range(4):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 2], name=f'Recipe {number}',
+                text='Text', cooking_time=number + 1,
+                image=SimpleUploadedFile(f'recipe{number}.png', PNG))
+            recipe.tags.set(cls.tags[number % 2:number % 2 + 2])
+            for offset in range(3):
+                IngredientAmount.objects.create(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + offset) % 5],
+                    amount=offset + 1)
+            cls.recipes.append(recipe)
+
+        for author in cls.authors:
+            Subscription.objects.create(user=cls.reader, author=author)
+        for recipe in cls.recipes[:2]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
@@ -0,0 +1,56 @@
+from api.tests.base import RecipeDataTestCase
+from recipes.counters import fill_counters
+from recipes.models import Recipe
+from users.models import User
+
+
+class FillCountersTest(RecipeDataTestCase):
+    """Rows older than the counters are counted after migrate."""
+
+    def test_fill_counters(self):
+        Recipe.objects.update(favorites_count=0)
+        User.objects.update(recipes_count=0, followers_count=0)
+        fill_counters(sender=None, using='default')
+
+        self.assertEqual(
+            dict(Recipe.objects.values_list('pk', 'favorites_count')),
+            {recipe.pk: int(recipe in self.recipes[:2])
+             for recipe in self.recipes})
+        for author in self.authors:
+            author.refresh_from_db()
+            self.assertEqual(author.recipes_count, 2)
+            self.assertEqual(author.followers_count, 1)
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.recipes_count, 0)
+
+    def test_kept_counters_are_left_alone(self):
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(
+            favorites_count=5)
+        fill_counters(sender=None, using='default')
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 5)
+
+
+class FavoritesCountTest(RecipeDataTestCase):
+
+    def favorites_counts(self):
+        return [
+            Recipe.objects.get(pk=recipe.pk).favorites_count
+            for recipe in self.recipes]
+
+    def test_bulk_favorite(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        self.client.post('/api/recipes/favorite/',
+                         {'recipes': recipe_ids}, format='json')
+        self.assertEqual(self.favorites_counts(), [1, 1, 1, 1])
+        self.client.delete('/api/recipes/favorite/',
+                           {'recipes': recipe_ids[1:]}, format='json')
+        self.assertEqual(self.favorites_counts(), [1, 0, 0, 0])
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipes[2].pk}/favorite/'
+        self.client.post(url)
+        self.assertEqual(self.favorites_counts(), [1, 1, 1, 0])
+        self.client.delete(url)
+        self.client.delete(url)
+        self.assertEqual(self.favorites_counts(), [1, 1, 0, 0])
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.test import override_settings
+
+from api.tests.base import RecipeDataTestCase
+
+
+class FastReadTest(RecipeDataTestCase):
+    """The fast read path renders the same bytes as the serializers."""
+
+    def clients(self):
+        return (('anonymous', self.anonymous), ('reader', self.client))
+
+    def assertSameContent(self, client, url):
+        responses = []
+        for fast_read in (False, True):
+            # Neither path may answer from what the other one cached.
+            cache.clear()
+            with override_settings(RECIPE_FAST_READ=fast_read):
+                responses.append(client.get(url))
+        serialized, fast = responses
+        self.assertEqual(fast.status_code, serialized.status_code)
+        self.assertEqual(fast.content, serialized.content)
+
+    def test_list(self):
+        for user, client in self.clients():
+            for query in ('', '?page=2&limit=3', '?tags=tag0',
+                          f'?author={self.authors[1].pk}',
+                          '?is_favorited=1', '?is_in_shopping_cart=1',
+                          f'?ingredients={self.ingredients[2].pk}'):
+                with self.subTest(user=user, query=query):
+                    self.assertSameContent(client, f'/api/recipes/{query}')
+
+    def test_detail(self):
+        for user, client in self.clients():
+            for recipe in self.recipes:
+                with self.subTest(user=user, recipe=recipe.pk):
+                    self.assertSameContent(
+                        client, f'/api/recipes/{recipe.pk}/')
+
+    def test_detail_missing(self):
+        self.assertSameContent(self.client, '/api/recipes/0/')
+
+    @override_settings(RECIPE_FAST_READ=True)
+    def test_anonymous_list_cached(self):
+        first = self.anonymous.get('/api/recipes/?tags=tag0')
+        with self.assertNumQueries(0):
+            repeat = self.anonymous.get('/api/recipes/?tags=tag0')
+        self.assertEqual(repeat.content, first.content)
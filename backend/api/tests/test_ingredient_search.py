@@ -0,0 +1,22 @@
+from api.tests.base import RecipeDataTestCase
+from recipes.ingredient_index import IngredientIndex, search_database
+from recipes.models import Ingredient
+
+
+class IngredientSearchTest(RecipeDataTestCase):
+    """A cold index falls back to the database with the same results."""
+
+    def test_database_search_matches_index(self):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='g')
+            for name in ('Sea salt', 'Salt', 'Salted butter')])
+        index = IngredientIndex()
+        index.build(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'))
+
+        for query in ('salt', 'SALT', 'ingredient', 'dient 3', 'pepper'):
+            for limit in (None, 1, 2):
+                with self.subTest(query=query, limit=limit):
+                    self.assertEqual(
+                        search_database(query, limit=limit),
+                        index.search(query, limit=limit))
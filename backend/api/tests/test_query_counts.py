@@ -0,0 +1,115 @@
+import base64
+
+from django.test import override_settings
+from rest_framework import status
+
+from api.tests.base import PNG, RecipeDataTestCase, make_png
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+class RecipeReadQueriesTest(RecipeDataTestCase):
+    """Reads cost a fixed number of queries, however many rows they show."""
+
+    def test_list_anonymous(self):
+        with self.assertNumQueries(6):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_list(self):
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_list_count_cached(self):
+        self.client.get('/api/recipes/')
+        # Only the page is read: the total and the cards are cached.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/recipes/?page=1')
+        self.assertEqual(response.data['count'], 4)
+        self.assertTrue(response.data['is_estimate'])
+
+    @override_settings(RECIPE_FAST_READ=True)
+    def test_list_fast_read(self):
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_list_ranked_and_filtered(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(
+                f'/api/recipes/?ingredients={self.ingredients[2].pk}'
+                '&tags=tag1')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_detail(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    @override_settings(RECIPE_FAST_READ=True)
+    def test_detail_fast_read(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_subscriptions(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_download_shopping_cart(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/recipes/download_shopping_cart/')
+            content = b''.join(response.streaming_content).decode()
+        self.assertIn('Ingredient 0', content)
+
+
+class RecipeWriteQueriesTest(RecipeDataTestCase):
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipes[2].pk}/favorite/'
+        with self.assertNumQueries(5):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(5):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Favorite.objects.filter(
+            user=self.reader, recipe=self.recipes[2]).exists())
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipes[2].pk}/shopping_cart/'
+        with self.assertNumQueries(9):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(9):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ShoppingCart.objects.filter(
+            user=self.reader, recipe=self.recipes[2]).exists())
+
+    def recipe_data(self, png):
+        return {
+            'name': 'New recipe', 'text': 'Text', 'cooking_time': 5,
+            'image': 'data:image/png;base64,' + base64.b64encode(png).decode(),
+            'tags': [tag.pk for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 2}
+                for ingredient in self.ingredients[:3]]}
+
+    def test_create_recipe(self):
+        with self.assertNumQueries(22):
+            response = self.client.post(
+                '/api/recipes/', self.recipe_data(PNG), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_recipe_image(self):
+        self.client.force_authenticate(self.authors[0])
+        recipe = self.recipes[0]
+        with self.assertNumQueries(25):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/',
+                self.recipe_data(make_png((255, 0, 0, 255))), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(
+            Recipe.objects.get(pk=recipe.pk).image.name, recipe.image.name)
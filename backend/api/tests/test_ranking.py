@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.tests.base import RecipeDataTestCase
+from recipes.models import Favorite, RecipeScore, ScoreCheckpoint, ShoppingCart
+from recipes.ranking import SCORE_EPOCH, date_old_cart_rows, recompute_scores
+
+
+class RecomputeScoresTest(RecipeDataTestCase):
+
+    def scored(self):
+        return set(RecipeScore.objects.values_list('recipe_id', flat=True))
+
+    def test_rows_are_found_by_id(self):
+        recompute_scores()
+        self.assertEqual(
+            self.scored(), {recipe.pk for recipe in self.recipes[:2]})
+        # Committed late: older than rows the last run already saw.
+        favorite = Favorite.objects.create(
+            user=self.reader, recipe=self.recipes[3])
+        Favorite.objects.filter(pk=favorite.pk).update(
+            date_added=timezone.now() - timedelta(hours=1))
+        self.assertEqual(recompute_scores(), 1)
+        self.assertIn(self.recipes[3].pk, self.scored())
+
+    def test_removal_is_recounted_without_new_rows(self):
+        recompute_scores()
+        Favorite.objects.filter(recipe=self.recipes[0]).delete()
+        ShoppingCart.objects.filter(recipe=self.recipes[0]).delete()
+        self.assertEqual(recompute_scores(), 1)
+        self.assertNotIn(self.recipes[0].pk, self.scored())
+
+
+class DateOldCartRowsTest(RecipeDataTestCase):
+
+    def test_first_migrate(self):
+        ScoreCheckpoint.objects.all().delete()
+        date_old_cart_rows(sender=None, using='default')
+        self.assertEqual(
+            set(ShoppingCart.objects.values_list('date_added', flat=True)),
+            {SCORE_EPOCH})
+
+    def test_later_migrate(self):
+        date_old_cart_rows(sender=None, using='default')
+        self.assertNotIn(
+            SCORE_EPOCH,
+            ShoppingCart.objects.values_list('date_added', flat=True))
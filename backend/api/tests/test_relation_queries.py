@@ -0,0 +1,82 @@
+from rest_framework import status
+
+from api.tests.base import RecipeDataTestCase
+from users.models import Subscription
+
+
+class RelationQueriesTest(RecipeDataTestCase):
+    """Relation writes lean on the unique constraints, not on lookups.
+
+    Successful favorite and cart writes are pinned with the other
+    recipe writes in ``test_query_counts``.
+    """
+
+    def assertQueries(self, number, method, url, status_code):
+        with self.assertNumQueries(number):
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_favorite_twice(self):
+        self.assertQueries(
+            5, 'post', f'/api/recipes/{self.recipes[0].pk}/favorite/',
+            status.HTTP_400_BAD_REQUEST)
+
+    def test_favorite_missing_recipe(self):
+        # The recipe field rejects it, as it always did.
+        self.assertQueries(1, 'post', '/api/recipes/0/favorite/',
+                           status.HTTP_400_BAD_REQUEST)
+        self.assertQueries(4, 'delete', '/api/recipes/0/favorite/',
+                           status.HTTP_404_NOT_FOUND)
+
+    def test_unfavorite_missing_favorite(self):
+        self.assertQueries(
+            4, 'delete', f'/api/recipes/{self.recipes[2].pk}/favorite/',
+            status.HTTP_400_BAD_REQUEST)
+
+    def test_cart_twice(self):
+        self.assertQueries(
+            5, 'post', f'/api/recipes/{self.recipes[0].pk}/shopping_cart/',
+            status.HTTP_400_BAD_REQUEST)
+
+    def test_cart_missing_recipe(self):
+        # The recipe field rejects it, as it always did.
+        self.assertQueries(1, 'post', '/api/recipes/0/shopping_cart/',
+                           status.HTTP_400_BAD_REQUEST)
+        self.assertQueries(5, 'delete', '/api/recipes/0/shopping_cart/',
+                           status.HTTP_404_NOT_FOUND)
+
+    def test_uncart_missing_cart(self):
+        self.assertQueries(
+            5, 'delete', f'/api/recipes/{self.recipes[2].pk}/shopping_cart/',
+            status.HTTP_400_BAD_REQUEST)
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.authors[0].pk}/subscribe/'
+        self.assertQueries(4, 'delete', url, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Subscription.objects.filter(
+            user=self.reader, author=self.authors[0]).exists())
+        self.assertQueries(6, 'post', url, status.HTTP_201_CREATED)
+        self.assertTrue(Subscription.objects.filter(
+            user=self.reader, author=self.authors[0]).exists())
+
+    def test_subscribe_twice(self):
+        self.assertQueries(
+            5, 'post', f'/api/users/{self.authors[0].pk}/subscribe/',
+            status.HTTP_400_BAD_REQUEST)
+
+    def test_subscribe_to_self(self):
+        self.assertQueries(
+            1, 'post', f'/api/users/{self.reader.pk}/subscribe/',
+            status.HTTP_400_BAD_REQUEST)
+
+    def test_subscribe_missing_author(self):
+        self.assertQueries(1, 'post', '/api/users/0/subscribe/',
+                           status.HTTP_404_NOT_FOUND)
+        self.assertQueries(2, 'delete', '/api/users/0/subscribe/',
+                           status.HTTP_404_NOT_FOUND)
+
+    def test_unsubscribe_missing_subscription(self):
+        self.assertQueries(
+            2, 'delete', f'/api/users/{self.reader.pk}/subscribe/',
+            status.HTTP_400_BAD_REQUEST)
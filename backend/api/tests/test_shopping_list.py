@@ -0,0 +1,121 @@
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+
+from api.tests.base import RecipeDataTestCase
+from recipes.models import IngredientAmount, ShoppingCart
+from recipes.shopping_list import FORMATS, arender, get_shopping_list, render
+from users.models import User
+
+
+class ShoppingListTest(RecipeDataTestCase):
+    """The materialized lists follow every change of the carts."""
+
+    def assertListsMatchCarts(self):
+        output = StringIO()
+        call_command('check_shopping_lists', stdout=output)
+        self.assertEqual(
+            output.getvalue().strip(),
+            f'{User.objects.count()} shopping lists checked, 0 drifted')
+
+    def shopping_list(self):
+        response = self.client.get('/api/recipes/shopping_list/')
+        return {item['name']: item['amount'] for item in response.data}
+
+    def test_list(self):
+        self.assertEqual(self.shopping_list(), {
+            'Ingredient 0': 1, 'Ingredient 1': 3, 'Ingredient 2': 5,
+            'Ingredient 3': 3})
+
+    def test_cart_added_and_removed(self):
+        url = f'/api/recipes/{self.recipes[2].pk}/shopping_cart/'
+        self.client.post(url)
+        self.assertListsMatchCarts()
+        self.client.delete(url)
+        self.assertListsMatchCarts()
+
+    def test_amount_changed(self):
+        amount = self.recipes[0].recipe_ingredient.get(
+            ingredient=self.ingredients[0])
+        amount.amount = 10
+        amount.save()
+        self.assertListsMatchCarts()
+        self.assertEqual(self.shopping_list()['Ingredient 0'], 10)
+
+    def test_amount_ingredient_changed(self):
+        amount = self.recipes[0].recipe_ingredient.get(
+            ingredient=self.ingredients[0])
+        amount.ingredient = self.ingredients[4]
+        amount.save()
+        self.assertListsMatchCarts()
+        self.assertNotIn('Ingredient 0', self.shopping_list())
+
+    def test_amount_recipe_changed(self):
+        amount = self.recipes[0].recipe_ingredient.get(
+            ingredient=self.ingredients[0])
+        amount.recipe = self.recipes[3]
+        amount.save()
+        self.assertListsMatchCarts()
+        self.assertNotIn('Ingredient 0', self.shopping_list())
+
+    def test_amount_deleted(self):
+        IngredientAmount.objects.filter(recipe=self.recipes[1]).delete()
+        self.assertListsMatchCarts()
+
+    def test_cart_recipe_changed(self):
+        cart = ShoppingCart.objects.get(
+            user=self.reader, recipe=self.recipes[0])
+        cart.recipe = self.recipes[2]
+        cart.save()
+        self.assertListsMatchCarts()
+
+    def test_cart_user_changed(self):
+        cart = ShoppingCart.objects.get(
+            user=self.reader, recipe=self.recipes[0])
+        cart.user = self.authors[0]
+        cart.save()
+        self.assertListsMatchCarts()
+
+    def test_recipe_deleted(self):
+        self.recipes[0].delete()
+        self.assertListsMatchCarts()
+
+    def test_bulk_cart_and_clear(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'recipes': recipe_ids}, format='json')
+        self.assertListsMatchCarts()
+        self.client.delete('/api/recipes/shopping_cart/',
+                           {'recipes': recipe_ids[:3]}, format='json')
+        self.assertListsMatchCarts()
+        self.assertEqual(len(self.shopping_list()), 3)
+        self.client.delete('/api/recipes/clear_shopping_cart/')
+        self.assertListsMatchCarts()
+        self.assertEqual(self.shopping_list(), {})
+
+    def test_download_after_ingredient_renamed(self):
+        url = '/api/recipes/download_shopping_cart/'
+        self.client.get(url).getvalue()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredients[0].name = 'Renamed'
+            self.ingredients[0].save()
+        content = self.client.get(url).getvalue().decode()
+        self.assertIn('Renamed', content)
+        self.assertNotIn('Ingredient 0', content)
+
+    def test_async_rendering(self):
+        items = list(get_shopping_list(self.reader))
+
+        async def arender_all(file_format):
+            async def aitems():
+                for item in items:
+                    yield item
+            return ''.join(
+                [chunk async for chunk in arender(file_format, aitems())])
+
+        for file_format in FORMATS:
+            with self.subTest(file_format=file_format):
+                self.assertEqual(
+                    async_to_sync(arender_all)(file_format),
+                    ''.join(render(file_format, items)))
@@ -0,0 +1,32 @@
+from django.test import override_settings
+
+from api.tests.base import RecipeDataTestCase
+
+
+class TagFilterTest(RecipeDataTestCase):
+    """Recipes with several of the selected tags are listed once."""
+
+    def assertListedOnce(self, query, expected):
+        response = self.anonymous.get(f'/api/recipes/?{query}')
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sorted(ids), sorted(
+            recipe.pk for recipe in expected))
+        self.assertEqual(response.data['count'], len(expected))
+
+    def test_every_tag(self):
+        self.assertListedOnce(
+            'tags=tag0&tags=tag1&tags=tag2', self.recipes)
+
+    def test_tags_of_the_same_recipes(self):
+        # Every recipe has tag1 and one of the others.
+        self.assertListedOnce('tags=tag0&tags=tag1', self.recipes)
+        self.assertListedOnce('tags=tag1&tags=tag2', self.recipes)
+
+    def test_one_tag(self):
+        self.assertListedOnce('tags=tag0', self.recipes[::2])
+
+    @override_settings(RECIPE_FAST_READ=True)
+    def test_fast_read(self):
+        self.assertListedOnce(
+            'tags=tag0&tags=tag1&tags=tag2', self.recipes)
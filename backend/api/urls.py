@@ -1,6 +1,9 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework import routers
 
+from api import async_views
+from api.views import SQLProfileView
 from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
 from users.views import CustomUserViewSet
 
@@ -13,7 +16,37 @@ v1_router.register('tags', TagViewSet, basename='tags')
 v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('users', CustomUserViewSet, basename='users')
 
+router_views = {}
+for pattern in v1_router.urls:
+    router_views.setdefault(pattern.name, pattern.callback)
+
+async_urlpatterns = [
+    re_path(r'^recipes/$', async_views.async_read(
+        async_views.recipe_list, router_views['recipes-list'])),
+    re_path(r'^recipes/download_shopping_cart/$', async_views.async_read(
+        async_views.download_shopping_cart,
+        router_views['recipes-download-shopping-cart'], negotiate=True)),
+    re_path(r'^recipes/(?P<pk>\d+)/$', async_views.async_read(
+        async_views.recipe_detail, router_views['recipes-detail'])),
+    re_path(r'^tags/$', async_views.async_read(
+        async_views.tag_list, router_views['tags-list'],
+        authenticate=False)),
+    re_path(r'^tags/(?P<pk>\d+)/$', async_views.async_read(
+        async_views.tag_detail, router_views['tags-detail'],
+        authenticate=False)),
+    re_path(r'^ingredients/$', async_views.async_read(
+        async_views.ingredient_list, router_views['ingredients-list'],
+        authenticate=False)),
+    re_path(r'^ingredients/(?P<pk>\d+)/$', async_views.async_read(
+        async_views.ingredient_detail, router_views['ingredients-detail'],
+        authenticate=False)),
+]
+
 urlpatterns = [
     path('', include(v1_router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('profiling/sql/', SQLProfileView.as_view(), name='sql-profile'),
 ]
+
+if settings.ASYNC_READ:
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -0,0 +1,24 @@
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from utils.profiling import profile_buffer
+
+
+class SQLProfileView(APIView):
+    """Most recent request profiles, newest first."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        records = profile_buffer.snapshot()
+        if request.query_params.get('suspected') == '1':
+            records = [
+                record for record in records
+                if record['suspected_n_plus_one']]
+        return Response(records)
+
+    def delete(self, request):
+        profile_buffer.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.profiling.SQLProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -97,6 +98,29 @@ DATABASES = {
 #     }
 # }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+SQL_PROFILING = os.getenv('SQL_PROFILING', default='False').lower() == 'true'
+
+SQL_PROFILING_SAMPLE_RATE = float(os.getenv('SQL_PROFILING_SAMPLE_RATE', 1.0))
+
+SQL_PROFILING_BUFFER = int(os.getenv('SQL_PROFILING_BUFFER', 200))
+
+SQL_PROFILING_N_PLUS_ONE = int(os.getenv('SQL_PROFILING_N_PLUS_ONE', 5))
+
+RECIPE_FAST_READ = (
+    os.getenv('RECIPE_FAST_READ', default='False').lower() == 'true')
+
+ASYNC_READ = os.getenv('ASYNC_READ', default='False').lower() == 'true'
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -15,6 +15,7 @@ class IngredientInlineAdmin(admin.StackedInline):
 class AmountIngredientAdmin(admin.ModelAdmin):
 
     list_display = ('recipe', 'ingredient', 'amount',)
+    list_select_related = ('recipe', 'ingredient')
 
 
 @admin.register(Tag)
@@ -35,12 +36,14 @@ class IngredientAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
 
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
 
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
 
 
 @admin.register(Recipe)
@@ -54,8 +57,12 @@ class RecipeAdmin(admin.ModelAdmin):
     )
 
     list_filter = ('name', 'author__username', 'tags__name')
+    list_select_related = ('author',)
     inlines = (IngredientInlineAdmin,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('ingredients')
+
     @admin.display(description='Ingredients')
     def display_ingredients(self, obj):
         ingredients_list = [
@@ -66,4 +73,4 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='In favorites')
     def display_favorites_count(self, obj):
-        return obj.recipes_favorite_related.count()
+        return obj.favorites_count
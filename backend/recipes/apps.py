@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from recipes import signals  # noqa: F401
+        from recipes.catalog import create_tag_index
+        from recipes.counters import fill_counters
+        from recipes.feed import build_missing_feeds
+        from recipes.ranking import date_old_cart_rows
+        from recipes.search import create_search_indexes
+        from recipes.shopping_list import build_missing_shopping_lists
+
+        post_migrate.connect(create_search_indexes, sender=self)
+        post_migrate.connect(create_tag_index, sender=self)
+        post_migrate.connect(build_missing_shopping_lists, sender=self)
+        post_migrate.connect(fill_counters, sender=self)
+        # After fill_counters, which tells which authors are fanned out.
+        post_migrate.connect(build_missing_feeds, sender=self)
+        post_migrate.connect(date_old_cart_rows, sender=self)
@@ -0,0 +1,59 @@
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+from recipes.models import Recipe, Tag
+from utils.cache import bump_version, get_version
+
+
+def catalog_version_key(model):
+    return f'catalog_version:{model._meta.label_lower}'
+
+
+def catalog_modified_key(model):
+    return f'catalog_modified:{model._meta.label_lower}'
+
+
+def get_catalog_state(model):
+    """Return the catalog version and its modification timestamp."""
+    version = get_version(catalog_version_key(model))
+    modified = cache.get(catalog_modified_key(model))
+    if modified is None:
+        cache.add(catalog_modified_key(model), int(time.time()), timeout=None)
+        modified = cache.get(catalog_modified_key(model))
+    return version, modified
+
+
+def bump_catalog_version(model):
+    cache.set(catalog_modified_key(model), int(time.time()), timeout=None)
+    return bump_version(catalog_version_key(model))
+
+
+def get_tag_ids():
+    """Map tag slugs to ids, cached until the tag catalog changes."""
+    key = f'tag_ids:{get_version(catalog_version_key(Tag))}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, timeout=None)
+    return tag_ids
+
+
+def create_tag_index(sender, using, **kwargs):
+    """Index the recipe/tag through table by tag first.
+
+    The automatic unique index leads with ``recipe_id``, which does not
+    help the tag filter's ``EXISTS`` probe, and the through table is not
+    a model of ours to declare indexes on.
+    """
+    connection = connections[using]
+    through = Recipe.tags.through._meta
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS {} ON {} ({}, {})'.format(
+                connection.ops.quote_name(f'{through.db_table}_tag_recipe'),
+                connection.ops.quote_name(through.db_table),
+                connection.ops.quote_name(through.get_field('tag').column),
+                connection.ops.quote_name(
+                    through.get_field('recipe').column)))
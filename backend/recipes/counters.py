@@ -0,0 +1,30 @@
+from django.db.models import Exists, OuterRef
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+from utils.models import related_count
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+FILL_BATCH_SIZE = 1000
+
+
+def fill_counters(sender, using, **kwargs):
+    """Count the rows that existed before the counters did, after migrate.
+
+    Counters still at their default with related rows to count are
+    filled; counters kept since then are left alone.
+    """
+    for model, field, related_model, related_field in COUNTERS:
+        pks = list(model.objects.using(using).filter(
+            Exists(related_model.objects.filter(
+                **{related_field: OuterRef('pk')})),
+            **{field: 0},
+        ).order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(pks), FILL_BATCH_SIZE):
+            model.objects.using(using).filter(
+                pk__in=pks[start:start + FILL_BATCH_SIZE],
+            ).update(**{field: related_count(related_model, related_field)})
@@ -0,0 +1,126 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+logger = logging.getLogger(__name__)
+
+FEED_BATCH_SIZE = 1000
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='feed')
+
+
+def is_fanned_out(author_id):
+    """Followers of authors past the limit read their recipes directly."""
+    return User.objects.filter(
+        pk=author_id,
+        followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def insert_batched(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= FEED_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe_id, author_id):
+    with transaction.atomic():
+        if not is_fanned_out(author_id):
+            return
+        # An unsubscribe or delete meanwhile waits, then removes the rows.
+        followers = list(Subscription.objects.select_for_update().filter(
+            author_id=author_id,
+        ).order_by('pk').values_list('user_id', flat=True))
+        if not Recipe.objects.select_for_update(no_key=True).filter(
+                pk=recipe_id).exists():
+            return
+        insert_batched(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for user_id in followers)
+
+
+def backfill_feed(user_id, author_id):
+    """Write the recipes of a newly followed author into the feed."""
+    with transaction.atomic():
+        if not is_fanned_out(author_id):
+            return
+        if not Subscription.objects.select_for_update().filter(
+                user_id=user_id, author_id=author_id).exists():
+            return
+        recipes = Recipe.objects.select_for_update(no_key=True).filter(
+            author_id=author_id,
+        ).order_by('pk').values_list('pk', flat=True)
+        insert_batched(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for recipe_id in recipes.iterator(chunk_size=FEED_BATCH_SIZE))
+
+
+def build_missing_feeds(sender, using, **kwargs):
+    """Fill the feeds of subscriptions made before the feed was kept."""
+    subscription_ids = list(Subscription.objects.using(using).filter(
+        ~Exists(FeedEntry.objects.filter(
+            user_id=OuterRef('user_id'), author_id=OuterRef('author_id'))),
+        Exists(Recipe.objects.filter(author_id=OuterRef('author_id'))),
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(subscription_ids), FEED_BATCH_SIZE):
+        with transaction.atomic(using=using):
+            # Locked in the order fan_out_recipe and backfill_feed use.
+            followed = list(Subscription.objects.using(using).filter(
+                pk__in=subscription_ids[start:start + FEED_BATCH_SIZE],
+            ).select_for_update().order_by('pk').values_list(
+                'user_id', 'author_id'))
+            recipe_ids = defaultdict(list)
+            for recipe_id, author_id in Recipe.objects.using(using).filter(
+                author_id__in={author_id for _, author_id in followed},
+            ).select_for_update(no_key=True).order_by('pk').values_list(
+                    'pk', 'author_id'):
+                recipe_ids[author_id].append(recipe_id)
+            insert_batched(
+                FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                          author_id=author_id)
+                for user_id, author_id in followed
+                for recipe_id in recipe_ids[author_id])
+
+
+def update_feed(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Feed update %s%s failed', function.__name__, args)
+    finally:
+        connection.close()
+
+
+def schedule_feed_update(function, *args):
+    # One row per follower is too much to write in the request.
+    transaction.on_commit(
+        lambda: executor.submit(update_feed, function, *args))
+
+
+def prune_feed(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def subscribed_recipes(user):
+    # Authors with too many followers are read on demand.
+    return Q(Exists(FeedEntry.objects.filter(
+        user=user, recipe=OuterRef('pk')))) | Q(
+        author__in=Subscription.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('author'))
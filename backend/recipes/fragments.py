@@ -0,0 +1,38 @@
+from recipes.catalog import catalog_version_key
+from recipes.models import Ingredient, Tag
+from utils.cache import bump_version, get_versions
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe_version:{recipe_id}'
+
+
+def author_version_key(user_id):
+    return f'author_version:{user_id}'
+
+
+def bump_recipe_versions(recipe_ids):
+    for recipe_id in recipe_ids:
+        bump_version(recipe_version_key(recipe_id))
+
+
+def bump_author_version(user_id):
+    return bump_version(author_version_key(user_id))
+
+
+def fragment_keys(recipes, base_url):
+    # Catalog versions cover renamed tags and ingredients.
+    catalog_keys = [catalog_version_key(Tag), catalog_version_key(Ingredient)]
+    version_keys = catalog_keys + [
+        key for recipe in recipes
+        for key in (recipe_version_key(recipe.pk),
+                    author_version_key(recipe.author_id))]
+    versions = get_versions(list(dict.fromkeys(version_keys)))
+    catalogs = ':'.join(str(versions[key]) for key in catalog_keys)
+    return [
+        f'recipe_fragment:{base_url}:{recipe.pk}:'
+        f'{versions[recipe_version_key(recipe.pk)]}:'
+        f'{versions[author_version_key(recipe.author_id)]}:{catalogs}'
+        for recipe in recipes]
@@ -0,0 +1,7 @@
+from utils.cache import bump_version
+
+RECIPE_GENERATION_KEY = 'recipe_generation'
+
+
+def bump_recipe_generation():
+    return bump_version(RECIPE_GENERATION_KEY)
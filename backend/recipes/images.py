@@ -0,0 +1,88 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from recipes.fragments import bump_recipe_versions
+from recipes.generation import bump_recipe_generation
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = {
+    'card': (360, 240),
+    'detail': (720, 480),
+    'retina': (1440, 960),
+}
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='renditions')
+
+
+def rendition_name(image_name, size, extension):
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, 'renditions', f'{stem}_{size}.{extension}')
+
+
+def build_renditions(image_name, storage=default_storage):
+    """Write every size and format of an image next to the original.
+
+    Touches only the storage, never the database, so it is safe to run
+    in a worker process. Returns the stored names per size and format
+    together with the source image they were built from.
+    """
+    with storage.open(image_name, 'rb') as file:
+        source = Image.open(file)
+        source.load()
+    if source.mode != 'RGB':
+        source = source.convert('RGB')
+
+    sizes = {}
+    for size, dimensions in RENDITION_SIZES.items():
+        image = source.copy()
+        image.thumbnail(dimensions, Image.LANCZOS)
+        sizes[size] = {}
+        for extension, (image_format, params) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, image_format, **params)
+            name = rendition_name(image_name, size, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            sizes[size][extension] = storage.save(
+                name, ContentFile(buffer.getvalue()))
+    return {'source': image_name, 'sizes': sizes}
+
+
+def has_current_renditions(recipe):
+    return bool(recipe.image) and (
+        recipe.renditions.get('source') == recipe.image.name)
+
+
+def generate_renditions(recipe_id, image_name):
+    try:
+        renditions = build_renditions(image_name)
+        if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+                renditions=renditions):
+            bump_recipe_generation()
+            bump_recipe_versions([recipe_id])
+    except Exception:
+        logger.exception('Renditions failed for recipe %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """Render the recipe image in the background once the save commits."""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(generate_renditions, recipe_id, image_name))
@@ -0,0 +1,106 @@
+import logging
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import Case, Value, When
+from django.db.models.functions import Lower
+
+from recipes.catalog import get_catalog_state
+from recipes.models import Ingredient
+from utils.filters import IngredientFilter
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='ingredient_index')
+
+
+class IngredientIndex:
+    """Process-local search index over ingredient names.
+
+    Names are kept lower-cased in a sorted array, so prefix matches are
+    found by bisection and returned before plain substring matches.
+    The index is rebuilt in the background once the ingredient catalog
+    version moves, which keeps every worker process in step with
+    ``Ingredient`` writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._scheduled = None
+        self._entries = ([], [])
+
+    def build(self, rows):
+        rows = sorted(
+            ({'id': row['id'],
+              'name': row['name'],
+              'measurement_unit': row['measurement_unit']} for row in rows),
+            key=lambda row: (row['name'].lower(), row['id']))
+        self._entries = ([row['name'].lower() for row in rows], rows)
+
+    def is_current(self, version):
+        return version == self._version
+
+    def refresh(self, version):
+        with self._lock:
+            if version != self._version:
+                self.build(Ingredient.objects.values(
+                    'id', 'name', 'measurement_unit'))
+                self._version = version
+
+    def schedule_refresh(self, version):
+        if version != self._scheduled:
+            self._scheduled = version
+            executor.submit(refresh_index, self, version)
+
+    def search(self, query, limit=None):
+        query = query.lower()
+        names, rows = self._entries
+
+        start = bisect_left(names, query)
+        end = start
+        while end < len(names) and names[end].startswith(query):
+            end += 1
+        result = rows[start:end]
+
+        if limit is None or len(result) < limit:
+            result += [
+                row for position, (name, row) in enumerate(zip(names, rows))
+                if query in name and not start <= position < end
+            ]
+        return result[:limit]
+
+
+ingredient_index = IngredientIndex()
+
+
+def refresh_index(index, version):
+    try:
+        index.refresh(version)
+    except Exception:
+        logger.exception('Ingredient index build failed')
+    finally:
+        connection.close()
+
+
+def search_database(query, limit=None):
+    """``IngredientIndex.search`` through IngredientFilter, whose
+    ``icontains`` the trigram index serves on PostgreSQL."""
+    return list(IngredientFilter(
+        data={'name': query}, queryset=Ingredient.objects.all(),
+    ).qs.order_by(
+        Case(When(name__istartswith=query, then=Value(0)), default=Value(1)),
+        Lower('name'), 'id',
+    ).values('id', 'name', 'measurement_unit')[:limit])
+
+
+def search_ingredients(query, limit=None):
+    version, _ = get_catalog_state(Ingredient)
+    if ingredient_index.is_current(version):
+        return ingredient_index.search(query, limit=limit)
+    # A cold or outdated index is not worth a whole table read per worker.
+    ingredient_index.schedule_refresh(version)
+    return search_database(query, limit=limit)
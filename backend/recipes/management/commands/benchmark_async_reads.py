@@ -0,0 +1,83 @@
+import asyncio
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/1/',
+    '/api/tags/',
+    '/api/ingredients/?name=a',
+)
+
+
+def reload_urlconf():
+    import api.urls
+    importlib.reload(api.urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+
+    help = ('Compare concurrent read throughput of the WSGI handler with '
+            'the ASGI handler serving the async views')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--path', action='append', dest='paths')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        urls = [paths[i % len(paths)] for i in range(options['requests'])]
+        concurrency = options['concurrency']
+
+        with override_settings(ASYNC_READ=False):
+            reload_urlconf()
+            self.report('WSGI, sync views', len(urls),
+                        self.run_wsgi(urls, concurrency))
+        with override_settings(ASYNC_READ=True):
+            reload_urlconf()
+            self.report('ASGI, async views', len(urls),
+                        asyncio.run(self.run_asgi(urls, concurrency)))
+        reload_urlconf()
+
+    @staticmethod
+    def run_wsgi(urls, concurrency):
+        def fetch(url):
+            try:
+                return Client().get(url).status_code
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(fetch, urls))
+        return time.perf_counter() - start, statuses
+
+    @staticmethod
+    async def run_asgi(urls, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                return (await client.get(url)).status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(fetch(url) for url in urls))
+        return time.perf_counter() - start, statuses
+
+    def report(self, label, count, result):
+        elapsed, statuses = result
+        failed = sum(status >= 400 for status in statuses)
+        self.stdout.write(
+            f'{label}: {count / elapsed:.1f} req/s, '
+            f'{elapsed * 1000 / count:.2f} ms/req, {failed} failed')
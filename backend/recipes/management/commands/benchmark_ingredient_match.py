@@ -0,0 +1,155 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import Ingredient, IngredientAmount, Recipe
+from recipes.recipe_index import (RecipeIngredientIndex, match_minimum,
+                                  recipe_index)
+from users.models import User
+from utils.filters import RecipeFilter
+
+MATCH_MODES = ('all', 'any', 'min:2')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+
+    help = ('Compare ?ingredients= matching in SQL with the in-memory '
+            'inverted index on synthetic recipes, rolled back afterwards, '
+            'both for the match alone and for a counted first page')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        author = User.objects.order_by('id').first()
+        if len(ingredient_ids) < options['per_recipe']:
+            raise CommandError('Not enough ingredients, run loaddata first')
+        if author is None:
+            raise CommandError('No user to own the synthetic recipes')
+
+        try:
+            with transaction.atomic():
+                self.run(author, ingredient_ids, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, author, ingredient_ids, options):
+        rng = random.Random(options['seed'])
+        # A few staples are in most recipes, the long tail in a few.
+        weights = [1 / rank for rank in range(1, len(ingredient_ids) + 1)]
+
+        start = time.perf_counter()
+        recipes = Recipe.objects.bulk_create(
+            (Recipe(author=author, name=f'Synthetic {number}', text='-',
+                    cooking_time=1, image='')
+             for number in range(options['recipes'])),
+            batch_size=5000)
+        IngredientAmount.objects.bulk_create(
+            (IngredientAmount(recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                              amount=1)
+             for recipe in recipes
+             for ingredient_id in self.sample(
+                 rng, ingredient_ids, weights, options['per_recipe'])),
+            batch_size=5000)
+        self.stdout.write(
+            f'{len(recipes)} recipes written in '
+            f'{time.perf_counter() - start:.1f} s')
+
+        queries = [
+            (rng.sample(ingredient_ids[:50], rng.randint(2, 5)),
+             rng.choice(MATCH_MODES))
+            for _ in range(options['queries'])]
+
+        start = time.perf_counter()
+        expected = [self.sql_match(*query) for query in queries]
+        sql_time = time.perf_counter() - start
+
+        index = RecipeIngredientIndex()
+        start = time.perf_counter()
+        index.build(IngredientAmount.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id').iterator(chunk_size=10000))
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [
+            index.match(ids, match_minimum(ids, match))
+            for ids, match in queries]
+        index_time = time.perf_counter() - start
+
+        page_size = options['page_size']
+        start = time.perf_counter()
+        expected_pages = [
+            self.sql_page(*query, page_size) for query in queries]
+        sql_page_time = time.perf_counter() - start
+
+        # Built here, so the synthetic recipes are in the process index.
+        recipe_index.refresh()
+        start = time.perf_counter()
+        pages = [self.index_page(*query, page_size) for query in queries]
+        index_page_time = time.perf_counter() - start
+
+        count = len(queries)
+        identical = 'yes' if results == expected else 'no'
+        identical_pages = 'yes' if pages == expected_pages else 'no'
+        self.stdout.write(
+            f'{count} queries, results identical: {identical}, '
+            f'pages identical: {identical_pages}\n'
+            f'SQL GROUP BY/HAVING: {sql_time / count * 1000:.3f} ms/query\n'
+            f'Index build:         {build_time * 1000:.1f} ms\n'
+            f'Index match:         {index_time / count * 1000:.3f} ms/query\n'
+            f'SQL count and page:  {sql_page_time / count * 1000:.3f} '
+            f'ms/query\n'
+            f'Filter, count, page: {index_page_time / count * 1000:.3f} '
+            f'ms/query')
+
+    @staticmethod
+    def sample(rng, ingredient_ids, weights, size):
+        chosen = set()
+        while len(chosen) < size:
+            chosen.update(rng.choices(ingredient_ids, weights, k=size))
+        return list(chosen)[:size]
+
+    @staticmethod
+    def sql_match(ids, match):
+        return dict(IngredientAmount.objects.filter(
+            ingredient_id__in=ids,
+        ).values('recipe_id').annotate(
+            coverage=Count('id'),
+        ).filter(
+            coverage__gte=match_minimum(ids, match),
+        ).values_list('recipe_id', 'coverage').order_by())
+
+    @staticmethod
+    def sql_page(ids, match, page_size):
+        queryset = Recipe.objects.filter(
+            recipe_ingredient__ingredient_id__in=ids,
+        ).annotate(
+            coverage=Count('recipe_ingredient'),
+        ).filter(
+            coverage__gte=match_minimum(ids, match),
+        ).order_by('-coverage', *Recipe._meta.ordering)
+        return queryset.count(), [
+            row['id'] for row in queryset.values('id')[:page_size]]
+
+    @staticmethod
+    def index_page(ids, match, page_size):
+        recipes = RecipeFilter(
+            {'ingredients': ','.join(map(str, ids)), 'match': match},
+            queryset=Recipe.objects.all(),
+            rank_in_memory=True,
+        ).ranked_qs
+        return len(recipes), [
+            row['id'] for row in recipes.values('id')[:page_size]]
@@ -0,0 +1,53 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+from utils.filters import IngredientFilter
+
+
+class Command(BaseCommand):
+
+    help = 'Compare IngredientFilter lookups with the in-memory index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rows = list(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'))
+        if not rows:
+            raise CommandError('No ingredients, run loaddata first')
+
+        rng = random.Random(options['seed'])
+        queries = [
+            rng.choice(rows)['name'][:rng.randint(1, 4)]
+            for _ in range(options['queries'])]
+
+        start = time.perf_counter()
+        for query in queries:
+            list(IngredientFilter(
+                data={'name': query},
+                queryset=Ingredient.objects.all(),
+            ).qs.values('id', 'name', 'measurement_unit'))
+        filter_time = time.perf_counter() - start
+
+        index = IngredientIndex()
+        start = time.perf_counter()
+        index.build(rows)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query)
+        index_time = time.perf_counter() - start
+
+        count = len(queries)
+        self.stdout.write(
+            f'{len(rows)} ingredients, {count} queries\n'
+            f'IngredientFilter: {filter_time / count * 1000:.3f} ms/query\n'
+            f'Index build:      {build_time * 1000:.3f} ms\n'
+            f'Index search:     {index_time / count * 1000:.3f} ms/query')
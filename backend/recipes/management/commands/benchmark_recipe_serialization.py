@@ -0,0 +1,66 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ListSerializer
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import recipe_rows, serialize_recipe_rows
+from api.serializers import RecipeListSerializer
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+
+    help = 'Compare RecipeListSerializer with the fast read path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--user', help='Username to serialize for, anonymous if omitted')
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('No such user')
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+
+        queryset = Recipe.objects.with_user_flags(user)
+        limit = options['limit']
+        count = queryset[:limit].count()
+        if not count:
+            raise CommandError('No recipes to serialize')
+
+        def serializer():
+            # A plain ListSerializer, so cached fragments are not reused.
+            return ListSerializer(
+                queryset.with_related_data()[:limit],
+                child=RecipeListSerializer(),
+                context={'request': request}).data
+
+        def fast():
+            return serialize_recipe_rows(
+                recipe_rows(queryset, user)[:limit], request)
+
+        renderer = JSONRenderer()
+        identical = (renderer.render(serializer())
+                     == renderer.render(fast()))
+
+        for label, build in (('RecipeListSerializer', serializer),
+                             ('Fast read path', fast)):
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                build()
+            elapsed = time.perf_counter() - start
+            per_recipe = elapsed / (options['repeat'] * count) * 1e6
+            self.stdout.write(f'{label}: {per_recipe:.1f} us/recipe')
+        identical = 'yes' if identical else 'no'
+        self.stdout.write(f'{count} recipes, output identical: {identical}')
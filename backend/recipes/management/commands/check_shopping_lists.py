@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import IngredientAmount, ShoppingListItem
+from recipes.shopping_list import (expected_totals, lock_users,
+                                   rebuild_shopping_lists)
+from users.models import User
+
+
+class Command(BaseCommand):
+
+    help = ('Compare materialized shopping lists with the carts they are '
+            'built from and report users whose list drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Rebuild the lists that drifted from the carts')
+
+    def handle(self, *args, **options):
+        checked = drifted = 0
+        last_pk = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']])
+            if not user_ids:
+                break
+
+            stale = self.compare(user_ids)
+            if stale and options['fix']:
+                with transaction.atomic():
+                    # Rebuilt from the carts under the lock, so changes
+                    # made since the comparison are counted as well.
+                    lock_users(stale)
+                    rebuild_shopping_lists(stale)
+
+            checked += len(user_ids)
+            drifted += len(stale)
+            last_pk = user_ids[-1]
+
+        action = 'rebuilt' if options['fix'] else 'drifted'
+        self.stdout.write(
+            f'{checked} shopping lists checked, {drifted} {action}')
+
+    @staticmethod
+    def compare(user_ids):
+        expected = defaultdict(dict)
+        for user_id, ingredient_id, total in expected_totals(
+                IngredientAmount.objects.filter(
+                    recipe__recipes_shoppingcart_related__user__in=user_ids)):
+            expected[user_id][ingredient_id] = total
+        stored = defaultdict(dict)
+        for user_id, ingredient_id, total in ShoppingListItem.objects.filter(
+                user_id__in=user_ids,
+        ).values_list('user_id', 'ingredient_id', 'total'):
+            stored[user_id][ingredient_id] = total
+        return [user_id for user_id in user_ids
+                if expected[user_id] != stored[user_id]]
@@ -0,0 +1,53 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.fragments import bump_recipe_versions
+from recipes.generation import bump_recipe_generation
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+
+    help = 'Render missing image renditions of existing recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Render again even if current renditions exist')
+
+    def handle(self, *args, **options):
+        pending = [
+            (pk, image)
+            for pk, image, renditions in Recipe.objects.exclude(
+                image='').values_list('pk', 'image', 'renditions').iterator()
+            if options['force'] or renditions.get('source') != image]
+        self.stdout.write(f'{len(pending)} recipes to render')
+
+        # Worker processes are forked, they must not share a connection.
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(build_renditions, image): (pk, image)
+                for pk, image in pending}
+            for future in as_completed(futures):
+                pk, image = futures[future]
+                try:
+                    renditions = future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'Recipe {pk}: {error}')
+                    continue
+                Recipe.objects.filter(pk=pk, image=image).update(
+                    renditions=renditions)
+                bump_recipe_versions([pk])
+                done += 1
+
+        if done:
+            bump_recipe_generation()
+        self.stdout.write(f'Rendered {done}, failed {failed}')
@@ -1,38 +1,135 @@
+import csv
 import json
+import os
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from recipes.catalog import bump_catalog_version
 from recipes.models import Ingredient, Tag
 
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Yield the objects of a top-level JSON array without reading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Expected a JSON array')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Malformed JSON file')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_ingredients(file, extension):
+    if extension == '.json':
+        for item in iter_json_array(file):
+            yield item['name'], item['measurement_unit']
+    elif extension == '.csv':
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+    else:
+        raise CommandError('Only .json and .csv files are supported')
+
 
 class Command(BaseCommand):
 
-    def handle(self, *args, **kwargs):
-        ingredients_file = open(
-            f'{settings.BASE_DIR}/data/ingredients.json',
-            encoding='utf-8')
+    help = 'Load ingredients and tags, skipping rows that already exist'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join(
+                settings.BASE_DIR, 'data', 'ingredients.json'),
+            help='Ingredients file, .json or .csv')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Parse and count new rows without writing them')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.load_ingredients(options['file'])
+        self.load_tags(os.path.join(settings.BASE_DIR, 'data', 'tags.json'))
+
+    def flush(self, model, batch):
+        if batch and not self.dry_run:
+            model.objects.bulk_create(
+                batch, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(batch)
+
+    def report(self, label, read, created, started):
+        elapsed = time.perf_counter() - started
+        rate = read / elapsed if elapsed else read
+        self.stdout.write(
+            f'{label}: {read} read, {created} new, '
+            f'{elapsed:.2f}s ({rate:.0f} rows/s)')
+
+    def load_ingredients(self, path):
+        started = time.perf_counter()
+        seen = set(Ingredient.objects.values_list('name', 'measurement_unit'))
+        batch = []
+        read = created = 0
         try:
-            ingredients_data = json.load(ingredients_file)
-            for item in ingredients_data:
-                Ingredient.objects.get_or_create(**item)
+            with open(path, encoding='utf-8', newline='') as file:
+                extension = os.path.splitext(path)[1].lower()
+                for name, measurement_unit in iter_ingredients(
+                        file, extension):
+                    read += 1
+                    if (name, measurement_unit) in seen:
+                        continue
+                    seen.add((name, measurement_unit))
+                    batch.append(Ingredient(
+                        name=name, measurement_unit=measurement_unit))
+                    if len(batch) >= self.batch_size:
+                        created += self.flush(Ingredient, batch)
+                        batch = []
+                        self.report('Ingredients', read, created, started)
         except FileNotFoundError:
             raise CommandError('Ingredients file not found')
-        finally:
-            ingredients_file.close()
+        created += self.flush(Ingredient, batch)
 
-        print('Ingredients uploaded')
+        if created and not self.dry_run:
+            bump_catalog_version(Ingredient)
+        self.report('Ingredients uploaded', read, created, started)
 
-        tags_file = open(
-            f'{settings.BASE_DIR}/data/tags.json',
-            encoding='utf-8')
+    def load_tags(self, path):
+        started = time.perf_counter()
         try:
-            tags_data = json.load(tags_file)
-            for item in tags_data:
-                Tag.objects.get_or_create(**item)
+            with open(path, encoding='utf-8') as file:
+                tags = list(iter_json_array(file))
         except FileNotFoundError:
             raise CommandError('Tags file not found')
-        finally:
-            tags_file.close()
 
-        print('Tags uploaded')
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        created = self.flush(Tag, [
+            Tag(**item) for item in tags if item['slug'] not in existing])
+
+        if created and not self.dry_run:
+            bump_catalog_version(Tag)
+        self.report('Tags uploaded', len(tags), created, started)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import recompute_scores
+
+
+class Command(BaseCommand):
+
+    help = ('Fold favorites and shopping cart activity since the last run '
+            'into the popular and trending scores')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop the checkpoint and recount every recipe')
+
+    def handle(self, *args, **options):
+        updated = recompute_scores(rebuild=options['rebuild'])
+        self.stdout.write(f'{updated} recipes rescored')
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS
+from utils.models import related_count
+
+
+class Command(BaseCommand):
+
+    help = 'Recompute denormalized counters and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            checked, drifted = self.reconcile(
+                model, field, related_model, related_field,
+                options['batch_size'], options['dry_run'])
+            self.stdout.write(
+                f'{model._meta.label}.{field}: '
+                f'{checked} rows checked, {drifted} drifted')
+
+    @staticmethod
+    def reconcile(model, field, related_model, related_field,
+                  batch_size, dry_run):
+        actual = related_count(related_model, related_field)
+
+        checked = drifted = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(actual=actual)
+                .values_list('pk', field, 'actual')[:batch_size])
+            if not rows:
+                return checked, drifted
+
+            stale = [pk for pk, stored, counted in rows if stored != counted]
+            if stale and not dry_run:
+                # Recounted inside the UPDATE, so concurrent F() changes
+                # made since the check are not lost.
+                model.objects.filter(pk__in=stale).update(**{field: actual})
+
+            checked += len(rows)
+            drifted += len(stale)
+            last_pk = rows[-1][0]
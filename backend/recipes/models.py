@@ -1,8 +1,13 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from users.models import User
+from users.models import Subscription, User
+from utils.models import CounterFieldsMixin
 
 MIN_VALUE = 1
 MAX_VALUE = 32000
@@ -69,7 +74,57 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+def recipe_card_prefetches():
+    return (
+        'tags',
+        Prefetch(
+            'recipe_ingredient',
+            queryset=IngredientAmount.objects.select_related('ingredient'),
+        ),
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related_data(self):
+        """Load everything the recipe card renders in constant queries."""
+        return self.select_related('author').prefetch_related(
+            *recipe_card_prefetches())
+
+    def latest_per_author(self, limit=None):
+        """Keep only the ``limit`` newest recipes of every author.
+
+        Filters on ``ROW_NUMBER() OVER (PARTITION BY author_id)``, so the
+        recipes of a whole page of authors come from a single query.
+        """
+        if limit is None:
+            return self
+        return self.annotate(author_row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).filter(author_row_number__lte=limit)
+
+    def with_user_flags(self, user):
+        """Annotate the viewer dependent booleans of the recipe card.
+
+        Adds ``is_favorited``, ``is_in_shopping_cart`` and
+        ``author_is_subscribed`` as ``EXISTS`` subqueries, so serializing
+        a page does not cost extra queries per recipe.
+        """
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
 
     name = models.CharField(
         'Recipe',
@@ -125,10 +180,38 @@ class Recipe(models.Model):
         editable=False,
     )
 
+    search_vector = SearchVectorField(
+        'Search vector',
+        null=True,
+        editable=False,
+    )
+
+    favorites_count = models.PositiveIntegerField(
+        'Favorites count',
+        default=0,
+        editable=False,
+    )
+
+    renditions = models.JSONField(
+        'Image renditions',
+        default=dict,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count',)
+
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.name}'
@@ -188,6 +271,7 @@ class Favorite(models.Model):
         'Add date',
         auto_now_add=True,
         editable=False,
+        db_index=True,
     )
 
     class Meta:
@@ -222,6 +306,13 @@ class ShoppingCart(models.Model):
         related_name='recipes_shoppingcart_related',
     )
 
+    date_added = models.DateTimeField(
+        'Add date',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
+
     class Meta:
         ordering = ('-id',)
         verbose_name = 'Recipe in shopping cart'
@@ -236,3 +327,141 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} added shopping cart'
+
+
+class FeedEntry(models.Model):
+    """A recipe delivered to the feed of one of its author's followers.
+
+    The author is copied from the recipe so that unsubscribing prunes
+    the feed without a join.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Follower',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Recipe',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+
+    author = models.ForeignKey(
+        User,
+        verbose_name='Author',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'Feed entry'
+        verbose_name_plural = 'Feed entries'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'), name='feed_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} in the feed of {self.user}'
+
+
+class ShoppingListItem(models.Model):
+    """Total amount of one ingredient over every recipe in a user's cart.
+
+    Kept in step with the cart and with recipe edits by
+    ``recipes.shopping_list``, so reading a list is a plain lookup.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='User',
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+    )
+
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ingredient',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    total = models.IntegerField('Total amount')
+
+    class Meta:
+        verbose_name = 'Shopping list item'
+        verbose_name_plural = 'Shopping list items'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} x {self.total} for {self.user}'
+
+
+class RecipeScore(models.Model):
+    """Time-decayed popularity of a recipe, kept by recompute_scores.
+
+    Scores are stored as logarithms relative to a fixed epoch, so they
+    never have to be decayed in place and order the same way at any time.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Recipe',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+    )
+
+    popular = models.FloatField('Popular score')
+
+    trending = models.FloatField('Trending score')
+
+    stale = models.BooleanField(
+        'Needs a full recount',
+        default=False,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Recipe score'
+        verbose_name_plural = 'Recipe scores'
+        indexes = (
+            models.Index(
+                fields=('-popular',), name='recipe_score_popular_idx'),
+            models.Index(
+                fields=('-trending',), name='recipe_score_trending_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} scores'
+
+
+class ScoreCheckpoint(models.Model):
+    """Activity rows up to these ids are reflected in the scores."""
+
+    last_favorite_id = models.BigIntegerField('Last favorite', null=True)
+
+    last_cart_id = models.BigIntegerField('Last cart row', null=True)
+
+    class Meta:
+        verbose_name = 'Score checkpoint'
+        verbose_name_plural = 'Score checkpoints'
+
+    def __str__(self):
+        return (f'Scores computed up to favorite {self.last_favorite_id} '
+                f'and cart row {self.last_cart_id}')
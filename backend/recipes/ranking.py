@@ -0,0 +1,162 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from django.db import connections, router, transaction
+from django.db.models import F, Max, Q
+
+from recipes.generation import bump_recipe_generation
+from recipes.models import Favorite, RecipeScore, ScoreCheckpoint, ShoppingCart
+from recipes.search import is_postgresql
+
+SCORE_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HALF_LIVES = {
+    'popular': timedelta(days=30),
+    'trending': timedelta(days=1),
+}
+ACTIVITY_WEIGHTS = (
+    (Favorite, 'last_favorite_id', 1.0),
+    (ShoppingCart, 'last_cart_id', 0.5),
+)
+
+
+def order_by_score(queryset, score):
+    return queryset.order_by(
+        F(f'score__{score}').desc(nulls_last=True), '-pub_date', '-id')
+
+
+def log_add(a, b):
+    """``log(exp(a) + exp(b))`` without overflowing."""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def event_scores(date_added, weight):
+    """Log-scores of one event, relative to ``SCORE_EPOCH``.
+
+    ``weight * exp(-ln 2 * age / half_life)`` at any later moment equals
+    this value minus a term that is the same for every recipe, so sums
+    built from it never need decaying to compare.
+    """
+    age = date_added - SCORE_EPOCH
+    return {
+        score: math.log(weight) + math.log(2) * (age / half_life)
+        for score, half_life in HALF_LIVES.items()
+    }
+
+
+def accumulate(scores, recipe_filter, bounds):
+    """Add the activity rows with ids in ``bounds[model]``, a pair of an
+    exclusive lower bound (or None) and an inclusive upper one."""
+    for model, _, weight in ACTIVITY_WEIGHTS:
+        since, until = bounds[model]
+        rows = model.objects.filter(recipe_filter, pk__lte=until).order_by()
+        if since is not None:
+            rows = rows.filter(pk__gt=since)
+        for recipe_id, date_added in rows.values_list(
+                'recipe_id', 'date_added').iterator(chunk_size=2000):
+            current = scores.setdefault(
+                recipe_id, dict.fromkeys(HALF_LIVES))
+            for score, value in event_scores(date_added, weight).items():
+                current[score] = log_add(current[score], value)
+
+
+def settled_ids():
+    """The highest id of each activity table with no insert still open.
+
+    Ids are drawn when rows are inserted, not when they commit. On
+    PostgreSQL a SHARE lock waits for the open writers, so every id up to
+    the maximum read under it is final; later inserts draw higher ids.
+    """
+    using = router.db_for_write(Favorite)
+    with transaction.atomic(using=using):
+        if is_postgresql(using):
+            quote = connections[using].ops.quote_name
+            tables = ', '.join(
+                quote(model._meta.db_table)
+                for model, _, _ in ACTIVITY_WEIGHTS)
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {tables} IN SHARE MODE')
+        return {
+            model: model.objects.aggregate(last=Max('pk'))['last'] or 0
+            for model, _, _ in ACTIVITY_WEIGHTS}
+
+
+def recompute_scores(rebuild=False):
+    """Fold activity since the last run into the score table.
+
+    New favorites and cart rows, found by id past the checkpoint, are
+    added to the stored scores. Removals leave nothing to read, so they
+    mark the score stale instead, and stale recipes are recounted from
+    all their rows. Returns the number of recipes updated.
+    """
+    settled = settled_ids()
+    with transaction.atomic():
+        checkpoint, _ = ScoreCheckpoint.objects.select_for_update(
+        ).get_or_create(pk=1)
+        since = {
+            model: None if rebuild else getattr(checkpoint, field)
+            for model, field, _ in ACTIVITY_WEIGHTS}
+        if any(since[model] is not None and since[model] > until
+               for model, until in settled.items()):
+            # A run that started later has already gone further.
+            return 0
+
+        scores = {}
+        if since[Favorite] is None:
+            since = dict.fromkeys(since)
+            RecipeScore.objects.all().delete()
+        else:
+            stale = list(RecipeScore.objects.select_for_update().filter(
+                stale=True).values_list('pk', flat=True))
+            accumulate(scores, Q(recipe_id__in=stale), {
+                model: (None, until) for model, until in settled.items()})
+            for recipe_id in stale:
+                scores.setdefault(recipe_id, None)
+
+        fresh = {}
+        accumulate(fresh, ~Q(recipe_id__in=list(scores)), {
+            model: (since[model], until) for model, until in settled.items()})
+        stored = RecipeScore.objects.select_for_update().in_bulk(list(fresh))
+        for recipe_id, values in fresh.items():
+            if recipe_id in stored:
+                for score in HALF_LIVES:
+                    values[score] = log_add(
+                        getattr(stored[recipe_id], score), values[score])
+            scores[recipe_id] = values
+
+        RecipeScore.objects.filter(
+            pk__in=[pk for pk, values in scores.items() if values is None],
+        ).delete()
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=recipe_id, stale=False, **values)
+             for recipe_id, values in scores.items() if values is not None],
+            update_conflicts=True,
+            unique_fields=('recipe',),
+            update_fields=(*HALF_LIVES, 'stale'),
+            batch_size=1000)
+
+        for model, field, _ in ACTIVITY_WEIGHTS:
+            setattr(checkpoint, field, settled[model])
+        checkpoint.save(update_fields=[
+            field for _, field, _ in ACTIVITY_WEIGHTS])
+        if scores:
+            transaction.on_commit(bump_recipe_generation)
+    return len(scores)
+
+
+def date_old_cart_rows(sender, using, **kwargs):
+    """Date cart rows older than their date_added column at the epoch.
+
+    The column was filled with the time of the migration, which would
+    make every old cart row count as trending. The checkpoint is created
+    here on the first migrate, when only such rows exist.
+    """
+    _, created = ScoreCheckpoint.objects.using(using).get_or_create(pk=1)
+    if created:
+        ShoppingCart.objects.using(using).update(date_added=SCORE_EPOCH)
+
+
+def mark_scores_stale(recipe_ids):
+    RecipeScore.objects.filter(pk__in=recipe_ids).update(stale=True)
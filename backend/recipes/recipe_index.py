@@ -0,0 +1,223 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import BooleanField, Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from recipes.models import IngredientAmount
+from utils.cache import bump_version, get_version
+
+INDEX_VERSION_KEY = 'recipe_ingredient_index'
+# Workers further behind than this rebuild instead of replaying changes.
+MAX_REPLAYED_CHANGES = 500
+CHANGE_TIMEOUT = 60 * 60
+
+
+def change_key(version):
+    return f'{INDEX_VERSION_KEY}:change:{version}'
+
+
+def contains(posting, recipe_id):
+    position = bisect_left(posting, recipe_id)
+    return position < len(posting) and posting[position] == recipe_id
+
+
+class RecipeIngredientIndex:
+    """Process-local inverted index from ingredient to recipes.
+
+    Each ingredient maps to a sorted ``array`` of recipe ids, a fraction
+    of the memory of a list of ints. Writers log the changed recipe ids
+    in the cache under the next index version; a worker that falls
+    behind re-reads only those recipes, or rebuilds if the log is gone.
+    Postings are replaced rather than edited, so searches need no lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._recipes = {}
+
+    def build(self, rows):
+        """Build from ``(recipe_id, ingredient_id)`` pairs."""
+        recipes = defaultdict(list)
+        postings = defaultdict(list)
+        for recipe_id, ingredient_id in rows:
+            recipes[recipe_id].append(ingredient_id)
+            postings[ingredient_id].append(recipe_id)
+        self._recipes = {
+            recipe_id: frozenset(ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()}
+        self._postings = {
+            ingredient_id: array('q', sorted(recipe_ids))
+            for ingredient_id, recipe_ids in postings.items()}
+
+    def update(self, recipe_ids, rows):
+        """Replace the ingredients of ``recipe_ids`` with ``rows``."""
+        wanted = defaultdict(set)
+        for recipe_id, ingredient_id in rows:
+            wanted[recipe_id].add(ingredient_id)
+
+        removed, added = defaultdict(list), defaultdict(list)
+        for recipe_id in recipe_ids:
+            current = self._recipes.get(recipe_id, frozenset())
+            new = frozenset(wanted[recipe_id])
+            for ingredient_id in current - new:
+                removed[ingredient_id].append(recipe_id)
+            for ingredient_id in new - current:
+                added[ingredient_id].append(recipe_id)
+            if new:
+                self._recipes[recipe_id] = new
+            else:
+                self._recipes.pop(recipe_id, None)
+
+        for ingredient_id in removed.keys() | added.keys():
+            posting = array('q', self._postings.get(ingredient_id, ()))
+            for recipe_id in removed[ingredient_id]:
+                del posting[bisect_left(posting, recipe_id)]
+            for recipe_id in added[ingredient_id]:
+                posting.insert(bisect_left(posting, recipe_id), recipe_id)
+            if posting:
+                self._postings[ingredient_id] = posting
+            else:
+                self._postings.pop(ingredient_id, None)
+
+    def refresh(self):
+        version = get_version(INDEX_VERSION_KEY)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            changes = None
+            if (self._version is not None
+                    and 0 < version - self._version <= MAX_REPLAYED_CHANGES):
+                keys = [change_key(number)
+                        for number in range(self._version + 1, version + 1)]
+                changes = cache.get_many(keys)
+                if len(changes) < len(keys):
+                    changes = None
+
+            if changes is None:
+                self.build(IngredientAmount.objects.order_by().values_list(
+                    'recipe_id', 'ingredient_id').iterator(chunk_size=10000))
+            else:
+                recipe_ids = set().union(*changes.values())
+                self.update(
+                    recipe_ids,
+                    IngredientAmount.objects.filter(
+                        recipe_id__in=recipe_ids,
+                    ).values_list('recipe_id', 'ingredient_id'))
+            self._version = version
+
+    def match(self, ingredient_ids, minimum):
+        """Map each recipe with ``minimum`` of the ingredients to the
+        number of them it uses."""
+        postings = sorted(
+            (self._postings.get(ingredient_id, array('q'))
+             for ingredient_id in set(ingredient_ids)),
+            key=len)
+        if minimum > len(postings):
+            return {}
+
+        if minimum == len(postings):
+            # Probe the shorter postings' ids in the longer ones.
+            candidates = postings[0]
+            for posting in postings[1:]:
+                candidates = [recipe_id for recipe_id in candidates
+                              if contains(posting, recipe_id)]
+            return dict.fromkeys(candidates, minimum)
+
+        coverage = Counter()
+        for posting in postings:
+            coverage.update(posting)
+        return {recipe_id: count for recipe_id, count in coverage.items()
+                if count >= minimum}
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def record_changes(recipe_ids):
+    version = bump_version(INDEX_VERSION_KEY)
+    cache.set(change_key(version), set(recipe_ids), CHANGE_TIMEOUT)
+
+
+def recipes_changed(recipe_ids):
+    """Log the recipes for every worker's index once the writes commit."""
+    recipe_ids = set(recipe_ids)
+    transaction.on_commit(lambda: record_changes(recipe_ids))
+
+
+def match_minimum(ingredient_ids, match):
+    """How many of the ingredients ``all``, ``any`` or ``min:N`` asks for."""
+    if match == 'any':
+        return 1
+    if match.startswith('min:'):
+        return int(match[len('min:'):])
+    return len(set(ingredient_ids))
+
+
+def rank_by_ingredients(ingredient_ids, match='all'):
+    """Ids of the recipes using the ingredients, the best covered first.
+
+    Ties stay newest first, as in the default ordering: ``pub_date`` is
+    set on insert, so the higher id is the newer recipe.
+    """
+    recipe_index.refresh()
+    coverage = recipe_index.match(
+        ingredient_ids, match_minimum(ingredient_ids, match))
+    return sorted(
+        coverage, key=lambda recipe_id: (-coverage[recipe_id], -recipe_id))
+
+
+class RankedRecipes:
+    """Recipes of ``queryset`` in the order of ranked ids, paged in memory.
+
+    Stands in for the queryset in the paginator: the count is the number
+    of ids, and a slice queries only the ids of that slice. Ids are
+    checked against the queryset's own filters in one query.
+    """
+
+    def __init__(self, queryset, recipe_ids):
+        self.queryset = queryset
+        self.recipe_ids = recipe_ids
+
+    @cached_property
+    def ids(self):
+        if not self.queryset.query.where:
+            return self.recipe_ids
+        found = set(self.queryset.filter(
+            self.id_filter()).values_list('pk', flat=True))
+        return [
+            recipe_id for recipe_id in self.recipe_ids if recipe_id in found]
+
+    def id_filter(self):
+        connection = connections[self.queryset.db]
+        if connection.vendor != 'postgresql':
+            return Q(pk__in=self.recipe_ids)
+        # One array parameter instead of one placeholder per id.
+        quote = connection.ops.quote_name
+        meta = self.queryset.model._meta
+        return RawSQL(
+            f'{quote(meta.db_table)}.{quote(meta.pk.column)} = ANY(%s)',
+            (list(self.recipe_ids),), output_field=BooleanField())
+
+    def values(self, *fields):
+        return RankedRecipes(self.queryset.values(*fields), self.recipe_ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        recipe_ids = self.ids[key]
+        return self.queryset.filter(pk__in=recipe_ids).order_by(Case(
+            *(When(pk=recipe_id, then=Value(rank))
+              for rank, recipe_id in enumerate(recipe_ids)),
+            output_field=IntegerField(),
+        ))
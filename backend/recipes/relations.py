@@ -0,0 +1,54 @@
+from django.db import connections, router, transaction
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.ranking import mark_scores_stale
+from recipes.shopping_list import bump_cart_version, cart_changed, lock_users
+from utils.models import adjust_counter
+
+
+def relations_changed(user_id, model, recipe_ids, sign):
+    """Do for many favorites or cart rows what their signals do for one.
+
+    ``sign`` is 1 for added relations and -1 for removed ones.
+    """
+    if not recipe_ids:
+        return
+    if model is Favorite:
+        # A user favorites a recipe once, so each count moves by one.
+        adjust_counter(
+            Recipe.objects.filter(pk__in=recipe_ids), 'favorites_count', sign)
+    else:
+        cart_changed(user_id, recipe_ids, sign)
+        transaction.on_commit(lambda: bump_cart_version(user_id))
+    if sign < 0:
+        mark_scores_stale(recipe_ids)
+
+
+def delete_relations(user_id, model, recipe_ids=None):
+    """Delete a user's favorites or cart rows and return their recipe ids.
+
+    One ``DELETE ... RETURNING`` instead of ``QuerySet.delete()``, which
+    would fetch the rows and send a signal per row; relations_changed
+    does the signals' work for all of them.
+    """
+    using = router.db_for_write(model)
+    quote = connections[using].ops.quote_name
+    user = quote(model._meta.get_field('user').column)
+    recipe = quote(model._meta.get_field('recipe').column)
+    sql = f'DELETE FROM {quote(model._meta.db_table)} WHERE {user} = %s'
+    params = [user_id]
+    if recipe_ids is not None:
+        recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+        if not recipe_ids:
+            return []
+        sql += f' AND {recipe} IN ({", ".join(["%s"] * len(recipe_ids))})'
+        params += recipe_ids
+    with transaction.atomic(using=using):
+        if model is ShoppingCart:
+            # Only the shopping list needs cart writers serialized.
+            lock_users([user_id])
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {recipe}', params)
+            deleted = [recipe_id for recipe_id, in cursor.fetchall()]
+        relations_changed(user_id, model, deleted, -1)
+    return deleted
@@ -0,0 +1,69 @@
+import logging
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Q
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'russian'
+
+SEARCH_VECTOR_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+TRIGRAM_INDEX_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm_gin '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+)
+
+
+def is_postgresql(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def recipe_search_vector():
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_vector(queryset):
+    if is_postgresql(queryset.db):
+        queryset.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, value):
+    """Full-text search ranked by ts_rank, ``icontains`` off PostgreSQL."""
+    if not is_postgresql(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value))
+
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+    ).order_by('-search_rank', *Recipe._meta.ordering)
+
+
+def create_search_indexes(sender, using, **kwargs):
+    """Add the GIN indexes and fill missing vectors after ``migrate``.
+
+    The indexes need PostgreSQL and the pg_trgm extension, so they are
+    created here rather than in model Meta to keep SQLite working.
+    """
+    if not is_postgresql(using):
+        return
+    with connections[using].cursor() as cursor:
+        for sql in SEARCH_VECTOR_INDEX_SQL:
+            cursor.execute(sql)
+        try:
+            with transaction.atomic(using=using):
+                for sql in TRIGRAM_INDEX_SQL:
+                    cursor.execute(sql)
+        except DatabaseError as error:
+            logger.warning('Trigram index was not created: %s', error)
+    update_search_vector(
+        Recipe.objects.using(using).filter(search_vector__isnull=True))
@@ -0,0 +1,227 @@
+import csv
+import json
+
+from django.db import connections, router, transaction
+from django.db.models import Exists, F, OuterRef, Sum
+
+from recipes.catalog import catalog_version_key
+from recipes.models import (Ingredient, IngredientAmount, Recipe, ShoppingCart,
+                            ShoppingListItem)
+from users.models import User
+from utils.cache import bump_version, get_versions
+
+SHOPPING_LIST_TITLE = 'Список покупок:\n\n'
+SHOPPING_LIST_FIELDS = ('name', 'measurement_unit', 'amount')
+UPSERT_BATCH_SIZE = 300
+BACKFILL_BATCH_SIZE = 1000
+
+
+def cart_version_key(user_id):
+    return f'shopping_cart_version:{user_id}'
+
+
+def bump_cart_version(user_id):
+    return bump_version(cart_version_key(user_id))
+
+
+def shopping_list_cache_key(user_id, file_format):
+    """Key of a rendered list, which also shows ingredient names."""
+    keys = [cart_version_key(user_id), catalog_version_key(Ingredient)]
+    versions = get_versions(keys)
+    return (f'shopping_list:{user_id}:{versions[keys[0]]}:'
+            f'{versions[keys[1]]}:{file_format}')
+
+
+def get_shopping_list(user):
+    """Read the materialized list together with name and unit."""
+    return ShoppingListItem.objects.filter(
+        user=user,
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(
+        amount=Sum('total'),
+    ).order_by('name', 'measurement_unit')
+
+
+def lock_users(user_ids):
+    """Serialize cart writes per user; every cart writer locks first.
+
+    The weaker NO KEY UPDATE lock leaves foreign key checks of rows
+    pointing at the user free to proceed.
+    """
+    return list(User.objects.select_for_update(no_key=True).filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def lock_recipes(recipe_ids):
+    """Keep ingredient edits out while their amounts are added to lists."""
+    return list(Recipe.objects.select_for_update(no_key=True).filter(
+        pk__in=recipe_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def lock_recipe_carts(recipe_id):
+    """Lock the recipe and return who has it in the cart.
+
+    Carts added later wait for the lock and then read the new amounts,
+    so only the users returned here need the edit applied.
+    """
+    lock_recipes([recipe_id])
+    return list(ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+
+
+def recipe_totals(recipe_ids):
+    return dict(IngredientAmount.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values('ingredient_id').annotate(
+        amount=Sum('amount'),
+    ).values_list('ingredient_id', 'amount').order_by())
+
+
+def add_amounts(rows):
+    """Add ``(user_id, ingredient_id, amount)`` rows to the lists.
+
+    One ``INSERT ... ON CONFLICT DO UPDATE`` per batch adds to existing
+    totals, which the ORM cannot express; rows are sorted so concurrent
+    writers take the row locks in the same order. Totals that reach zero
+    are dropped.
+    """
+    rows = sorted(row for row in rows if row[2])
+    if not rows:
+        return
+    using = router.db_for_write(ShoppingListItem)
+    quote = connections[using].ops.quote_name
+    table = quote(ShoppingListItem._meta.db_table)
+    user, ingredient, total = map(quote, ('user_id', 'ingredient_id', 'total'))
+    sql = (f'INSERT INTO {table} ({user}, {ingredient}, {total}) VALUES {{}} '
+           f'ON CONFLICT ({user}, {ingredient}) DO UPDATE '
+           f'SET {total} = {table}.{total} + EXCLUDED.{total}')
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                sql.format(', '.join(['(%s, %s, %s)'] * len(batch))),
+                [value for row in batch for value in row])
+    ShoppingListItem.objects.filter(
+        user_id__in={row[0] for row in rows},
+        ingredient_id__in={row[1] for row in rows},
+        total__lte=0,
+    ).delete()
+
+
+def cart_changed(user_id, recipe_ids, sign):
+    """Add (``sign=1``) or take away (``-1``) the recipes' ingredients.
+
+    The caller holds the user lock.
+    """
+    lock_recipes(recipe_ids)
+    add_amounts(
+        (user_id, ingredient_id, sign * amount)
+        for ingredient_id, amount in recipe_totals(recipe_ids).items())
+
+
+def recipe_amounts_changed(user_ids, changes):
+    """Apply ``{ingredient_id: change}`` of one recipe to its carts.
+
+    ``user_ids`` comes from ``lock_recipe_carts`` called before the old
+    amounts were read. Writers of one user's list need no lock between
+    them, as the upsert adds to whatever total is there.
+    """
+    add_amounts(
+        (user_id, ingredient_id, change)
+        for user_id in user_ids
+        for ingredient_id, change in changes.items())
+
+
+def rebuild_shopping_lists(user_ids, ingredient_ids=None):
+    """Recompute lists from the carts, for when the change is unknown."""
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+    amounts = IngredientAmount.objects.filter(
+        recipe__recipes_shoppingcart_related__user__in=user_ids)
+    if ingredient_ids is not None:
+        items = items.filter(ingredient_id__in=ingredient_ids)
+        amounts = amounts.filter(ingredient_id__in=ingredient_ids)
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         total=total)
+        for user_id, ingredient_id, total in expected_totals(amounts))
+
+
+def build_missing_shopping_lists(sender, using, **kwargs):
+    """Build the lists of carts filled before the lists were kept.
+
+    Runs after ``migrate``, so a deploy does not serve those carts as
+    empty downloads. Users with cart rows and no list rows are rebuilt.
+    """
+    user_ids = list(ShoppingCart.objects.using(using).filter(
+        ~Exists(ShoppingListItem.objects.filter(user_id=OuterRef('user_id'))),
+    ).values_list('user_id', flat=True).distinct().order_by('user_id'))
+    for start in range(0, len(user_ids), BACKFILL_BATCH_SIZE):
+        batch = user_ids[start:start + BACKFILL_BATCH_SIZE]
+        with transaction.atomic(using=using):
+            rebuild_shopping_lists(lock_users(batch))
+        for user_id in batch:
+            bump_cart_version(user_id)
+
+
+def expected_totals(amounts):
+    return amounts.values(
+        'recipe__recipes_shoppingcart_related__user', 'ingredient_id',
+    ).annotate(
+        amount=Sum('amount'),
+    ).values_list(
+        'recipe__recipes_shoppingcart_related__user', 'ingredient_id',
+        'amount',
+    ).order_by()
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+CSV_WRITER = csv.writer(_Echo())
+
+
+def render_txt_item(item):
+    return f'{item["name"]}, {item["amount"]} {item["measurement_unit"]}\n'
+
+
+def render_csv_item(item):
+    return CSV_WRITER.writerow([item[field] for field in SHOPPING_LIST_FIELDS])
+
+
+def render_json_item(item):
+    return json.dumps(item, ensure_ascii=False)
+
+
+# A prefix, the item renderer, the separator between items and a suffix,
+# shared by the sync and the async rendering.
+FORMATS = {
+    'txt': (SHOPPING_LIST_TITLE, render_txt_item, '', ''),
+    'csv': (CSV_WRITER.writerow(SHOPPING_LIST_FIELDS), render_csv_item, '',
+            ''),
+    'json': ('[', render_json_item, ',', ']'),
+}
+
+
+def render(file_format, items):
+    prefix, render_item, separator, suffix = FORMATS[file_format]
+    yield prefix
+    for number, item in enumerate(items):
+        yield (separator if number else '') + render_item(item)
+    yield suffix
+
+
+async def arender(file_format, items):
+    prefix, render_item, separator, suffix = FORMATS[file_format]
+    yield prefix
+    number = 0
+    async for item in items:
+        yield (separator if number else '') + render_item(item)
+        number += 1
+    yield suffix
@@ -0,0 +1,236 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.catalog import bump_catalog_version
+from recipes.feed import (backfill_feed, fan_out_recipe, prune_feed,
+                          schedule_feed_update)
+from recipes.fragments import bump_author_version, bump_recipe_versions
+from recipes.generation import bump_recipe_generation
+from recipes.images import has_current_renditions, schedule_renditions
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag)
+from recipes.ranking import mark_scores_stale
+from recipes.recipe_index import recipes_changed
+from recipes.search import update_search_vector
+from recipes.shopping_list import (bump_cart_version, cart_changed,
+                                   lock_recipe_carts, lock_users,
+                                   rebuild_shopping_lists,
+                                   recipe_amounts_changed, recipe_totals)
+from users.models import Subscription, User
+from utils.models import adjust_counter
+
+
+RELATION_FIELDS = {
+    ShoppingCart: ('user_id', 'recipe_id'),
+    IngredientAmount: ('recipe_id', 'ingredient_id'),
+}
+
+
+def is_direct_delete(sender, origin):
+    """Tell a delete of ``sender`` rows from one cascading from elsewhere."""
+    return getattr(origin, 'model', type(origin)) is sender
+
+
+def previous_values(instance):
+    return getattr(instance, '_previous_values', None) or {}
+
+
+def bump_cart_versions_for_recipe(recipe_id):
+    def bump():
+        user_ids = ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True)
+        for user_id in user_ids:
+            bump_cart_version(user_id)
+    transaction.on_commit(bump)
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=IngredientAmount)
+def relation_saving(sender, instance, **kwargs):
+    # The admin can move an existing row to another recipe, user or
+    # ingredient, and both sides of the move need their lists recounted.
+    instance._previous_values = None
+    if not instance._state.adding:
+        instance._previous_values = sender.objects.filter(
+            pk=instance.pk).values(*RELATION_FIELDS[sender]).first()
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_cart_version(user_id))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(sender, instance, created, **kwargs):
+    if created:
+        # Saves outside a transaction still need one for the locks.
+        with transaction.atomic(savepoint=False):
+            lock_users([instance.user_id])
+            cart_changed(instance.user_id, [instance.recipe_id], 1)
+        return
+
+    previous = previous_values(instance)
+    user_id = previous.get('user_id', instance.user_id)
+    if (user_id == instance.user_id
+            and previous.get('recipe_id') in (None, instance.recipe_id)):
+        return
+    with transaction.atomic(savepoint=False):
+        rebuild_shopping_lists(lock_users([instance.user_id, user_id]))
+    transaction.on_commit(lambda: bump_cart_version(user_id))
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, origin=None, **kwargs):
+    # A deleted recipe is taken off lists by recipe_deleting, a deleted
+    # user's list goes with the user.
+    if is_direct_delete(sender, origin):
+        lock_users([instance.user_id])
+        cart_changed(instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Favorite)
+def activity_removed(sender, instance, **kwargs):
+    mark_scores_stale([instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    transaction.on_commit(bump_recipe_generation)
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: bump_recipe_versions([recipe_id]))
+    if update_fields is None or {'name', 'text'} & update_fields:
+        update_search_vector(Recipe.objects.filter(pk=instance.pk))
+    # Recipe forms write ingredients in bulk, then save the recipe.
+    recipes_changed([instance.pk])
+    if instance.image and not has_current_renditions(instance):
+        schedule_renditions(instance)
+    if created:
+        adjust_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1)
+        schedule_feed_update(fan_out_recipe, recipe_id, instance.author_id)
+    else:
+        bump_cart_versions_for_recipe(instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    user_ids = lock_recipe_carts(instance.pk)
+    recipe_amounts_changed(user_ids, {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_totals([instance.pk]).items()})
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    transaction.on_commit(bump_recipe_generation)
+    adjust_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(
+            Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    adjust_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', -1)
+
+
+def recipe_ingredients_changed(recipe_ids):
+    transaction.on_commit(bump_recipe_generation)
+    transaction.on_commit(lambda: bump_recipe_versions(recipe_ids))
+    for recipe_id in recipe_ids:
+        bump_cart_versions_for_recipe(recipe_id)
+    recipes_changed(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=IngredientAmount)
+def ingredient_amount_changed(sender, instance, **kwargs):
+    recipe_ingredients_changed({instance.recipe_id, previous_values(
+        instance).get('recipe_id', instance.recipe_id)})
+
+
+@receiver(post_save, sender=IngredientAmount)
+def ingredient_amount_saved(sender, instance, created, **kwargs):
+    if created:
+        with transaction.atomic(savepoint=False):
+            recipe_amounts_changed(
+                lock_recipe_carts(instance.recipe_id),
+                {instance.ingredient_id: instance.amount})
+        return
+
+    # The previous amount is gone, so recount the ingredients involved.
+    previous = previous_values(instance)
+    recipe_ids = {instance.recipe_id,
+                  previous.get('recipe_id', instance.recipe_id)}
+    ingredient_ids = {instance.ingredient_id,
+                      previous.get('ingredient_id', instance.ingredient_id)}
+    with transaction.atomic(savepoint=False):
+        user_ids = set()
+        for recipe_id in sorted(recipe_ids):
+            user_ids.update(lock_recipe_carts(recipe_id))
+        rebuild_shopping_lists(user_ids, ingredient_ids)
+
+
+@receiver(post_delete, sender=IngredientAmount)
+def ingredient_amount_deleted(sender, instance, origin=None, **kwargs):
+    if is_direct_delete(sender, origin):
+        user_ids = lock_recipe_carts(instance.recipe_id)
+        recipe_amounts_changed(
+            user_ids, {instance.ingredient_id: -instance.amount})
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def catalog_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_catalog_version(sender))
+    transaction.on_commit(bump_recipe_generation)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    transaction.on_commit(bump_recipe_generation)
+    if not reverse:
+        recipe_ids = [instance.pk]
+        transaction.on_commit(lambda: bump_recipe_versions(recipe_ids))
+    elif pk_set is not None:
+        recipe_ids = set(pk_set)
+        transaction.on_commit(lambda: bump_recipe_versions(recipe_ids))
+    else:
+        transaction.on_commit(lambda: bump_catalog_version(Tag))
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which recipe lists do not show.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        transaction.on_commit(bump_recipe_generation)
+        user_id = instance.pk
+        transaction.on_commit(lambda: bump_author_version(user_id))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(
+            User.objects.filter(pk=instance.author_id), 'followers_count', 1)
+        schedule_feed_update(
+            backfill_feed, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    adjust_counter(
+        User.objects.filter(pk=instance.author_id), 'followers_count', -1)
+    prune_feed(instance.user_id, instance.author_id)
@@ -1,28 +1,52 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from api.fast_serializers import recipe_rows, serialize_recipe_rows
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
-                             RecipeListSerializer, RecipeSerializer,
-                             ShoppingCartSerializer, TagSerializer)
-from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
-from utils.filters import IngredientFilter, RecipeFilter
+                             RecipeIdsSerializer, RecipeListSerializer,
+                             RecipeSerializer, ShoppingCartSerializer,
+                             TagSerializer)
+from recipes.generation import RECIPE_GENERATION_KEY
+from recipes.ingredient_index import search_ingredients
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.ranking import order_by_score
+from recipes.relations import delete_relations, relations_changed
+from recipes.shopping_list import (get_shopping_list, lock_users, render,
+                                   shopping_list_cache_key)
+from utils.filters import IngredientFilter, RecipeFilter, RecipeFilterBackend
+from utils.mixins import AnonymousListCacheMixin, CatalogCacheMixin
 from utils.paginations import CustomPagination
 from utils.permissions import IsAuthorOrReadOnly
+from utils.renderers import CSVRenderer, PlainTextRenderer
 
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+def cache_chunks(chunks, key, timeout):
+    rendered = []
+    for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(rendered), timeout)
+
+
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -30,15 +54,79 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+
+        limit = request.query_params.get('limit', '')
+        limit = int(limit) if limit.isdigit() else None
+        return self.catalog_response(
+            request, lambda: search_ingredients(name, limit=limit))
 
-class RecipeViewSet(viewsets.ModelViewSet):
 
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'ingredients')
+class RecipeViewSet(AnonymousListCacheMixin, viewsets.ModelViewSet):
+
+    queryset = Recipe.objects.with_related_data()
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = CustomPagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (RecipeFilterBackend,)
     filterset_class = RecipeFilter
+    list_generation_key = RECIPE_GENERATION_KEY
+
+    @property
+    def cursor_ordering(self):
+        # Scores move under a cursor, so score orderings use page numbers,
+        # and ingredient coverage is no column to seek on.
+        if (self.action == 'popular'
+                or 'ordering' in self.request.query_params
+                or 'ingredients' in self.request.query_params):
+            return None
+        return Recipe._meta.ordering
+
+    @property
+    def rank_in_memory(self):
+        # Score orderings sort in SQL, so they keep the match in the query.
+        return (self.action == 'list'
+                and 'ordering' not in self.request.query_params)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'popular'):
+            # CachedRecipeListSerializer prefetches cache misses only.
+            queryset = Recipe.objects.select_related('author')
+        return queryset.with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_READ:
+            return super().list(request, *args, **kwargs)
+        return self.anonymous_list_response(
+            request, lambda: self.fast_list(request))
+
+    def fast_list(self, request):
+        rows = recipe_rows(
+            self.filter_queryset(self.get_queryset()), request.user)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(
+            serialize_recipe_rows(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_READ:
+            return super().retrieve(request, *args, **kwargs)
+        row = get_object_or_404(
+            recipe_rows(self.get_queryset(), request.user), pk=kwargs['pk'])
+        return Response(serialize_recipe_rows([row], request)[0])
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if (self.action == 'popular'
+                and 'ordering' not in self.request.query_params):
+            queryset = order_by_score(queryset, 'popular')
+        return queryset
+
+    @action(methods=['get'], detail=False)
+    def popular(self, request):
+        return self.list(request)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -50,8 +138,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk=None):
         serializer = ShoppingCartSerializer(
-            data={'user': request.user.id, 'recipe': pk},
-            context={'request': request})
+            data={'recipe': pk}, context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data,
@@ -59,42 +146,111 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
-        recipe = Recipe.objects.filter(id=pk)
-        if not recipe.exists():
-            return Response({'error': 'no such recipe'},
-                            status=status.HTTP_404_NOT_FOUND)
+        return self.remove_relation(request, ShoppingCart, pk)
+
+    def add_relations(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        with transaction.atomic():
+            # With the user locked nobody else adds to these relations,
+            # so the rows missing now are the ones the insert adds.
+            lock_users([request.user.id])
+            existing = set(model.objects.filter(
+                user=request.user, recipe_id__in=recipe_ids,
+            ).values_list('recipe_id', flat=True))
+            model.objects.bulk_create(
+                [model(user=request.user, recipe_id=recipe_id)
+                 for recipe_id in recipe_ids],
+                ignore_conflicts=True)
+            relations_changed(
+                request.user.id, model,
+                [pk for pk in recipe_ids if pk not in existing], 1)
+        return Response({'recipes': recipe_ids},
+                        status=status.HTTP_201_CREATED)
 
-        instance = request.user.recipes_shoppingcart_related.filter(
-            recipe_id=pk)
-        if instance.exists():
-            instance.delete()
+    def remove_relations(self, request, model, recipe_ids=None):
+        delete_relations(request.user.id, model, recipe_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def remove_relation(self, request, model, pk):
+        """Delete first; tell a missing recipe from a missing row after."""
+        if delete_relations(request.user.id, model, [pk]):
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        if not Recipe.objects.filter(id=pk).exists():
+            return Response({'error': 'no such recipe'},
+                            status=status.HTTP_404_NOT_FOUND)
         return Response({'error': 'no such recipe'},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    @action(methods=['get'],
+    @action(methods=['post'],
             detail=False,
+            url_path='shopping_cart',
+            url_name='bulk-shopping-cart',
             permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
-        shopping_cart = self.request.user.recipes_shoppingcart_related.all()
-        recipes = [item.recipe.id for item in shopping_cart]
-        shopping_list = IngredientAmount.objects.filter(
-            recipe__in=recipes).values('ingredient').annotate(
-            amount=Sum('amount'))
+    def bulk_shopping_cart(self, request):
+        return self.add_relations(request, ShoppingCart)
 
-        shopping_list_text = 'Список покупок:\n\n'
+    @bulk_shopping_cart.mapping.delete
+    def bulk_delete_shopping_cart(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.remove_relations(
+            request, ShoppingCart, serializer.validated_data['recipes'])
 
-        for item in shopping_list:
-            ingredient = Ingredient.objects.get(pk=item['ingredient'])
-            amount = item['amount']
-            shopping_list_text += (f'{ingredient.name}, {amount} '
-                                   f'{ingredient.measurement_unit}\n')
+    @action(methods=['delete'],
+            detail=False,
+            permission_classes=[IsAuthenticated])
+    def clear_shopping_cart(self, request):
+        return self.remove_relations(request, ShoppingCart)
 
-        response = HttpResponse(shopping_list_text, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename=shopping_list.txt')
+    @action(methods=['post'],
+            detail=False,
+            url_path='favorite',
+            url_name='bulk-favorite',
+            permission_classes=[IsAuthenticated])
+    def bulk_favorite(self, request):
+        return self.add_relations(request, Favorite)
+
+    @bulk_favorite.mapping.delete
+    def bulk_delete_favorite(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.remove_relations(
+            request, Favorite, serializer.validated_data['recipes'])
+
+    @action(methods=['get'],
+            detail=False,
+            permission_classes=[IsAuthenticated],
+            pagination_class=None)
+    def shopping_list(self, request):
+        return Response(list(get_shopping_list(request.user)))
 
+    @action(methods=['get'],
+            detail=False,
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
+    def download_shopping_cart(self, request):
+        renderer = request.accepted_renderer
+        file_format = renderer.format
+        cache_key = shopping_list_cache_key(request.user.id, file_format)
+        content_type = f'{renderer.media_type}; charset=utf-8'
+
+        rendered = cache.get(cache_key)
+        if rendered is not None:
+            response = HttpResponse(rendered, content_type=content_type)
+        else:
+            # Streams under WSGI. ASGI would consume this sync iterator
+            # whole first; the async route streams there instead.
+            chunks = render(
+                file_format, get_shopping_list(request.user).iterator())
+            response = StreamingHttpResponse(
+                cache_chunks(chunks, cache_key, SHOPPING_LIST_CACHE_TIMEOUT),
+                content_type=content_type)
+
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_list.{file_format}')
         return response
 
     @action(methods=['post'],
@@ -102,8 +258,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
         serializer = FavoriteSerializer(
-            data={'user': request.user.id, 'recipe': pk},
-            context={'request': request})
+            data={'recipe': pk}, context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data,
@@ -111,17 +266,4 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk=None):
-        recipe = Recipe.objects.filter(id=pk)
-        if not recipe.exists():
-            return Response({'error': 'no such recipe'},
-                            status=status.HTTP_404_NOT_FOUND)
-
-        instance = request.user.recipes_favorite_related.filter(recipe=pk)
-
-        if instance.exists():
-            instance.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response(
-            {'error': 'no such recipe'},
-            status=status.HTTP_400_BAD_REQUEST)
+        return self.remove_relation(request, Favorite, pk)
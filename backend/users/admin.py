@@ -20,4 +20,5 @@ class UserAdmin(UserAdmin):
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
+    list_select_related = ('user', 'author')
     list_filter = ('id', 'user', 'author')
@@ -1,10 +1,28 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.core.exceptions import ValidationError
 from django.core.validators import EmailValidator, RegexValidator
 from django.db import models
+from django.db.models import Exists, OuterRef
 
+from utils.models import CounterFieldsMixin
 
-class User(AbstractUser):
+
+class UserQuerySet(models.QuerySet):
+
+    def with_subscription_flag(self, user):
+        """Annotate ``is_subscribed`` for the given viewer."""
+        if not user.is_authenticated:
+            return self
+        return self.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))))
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
+class User(CounterFieldsMixin, AbstractUser):
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username',
@@ -40,6 +58,22 @@ class User(AbstractUser):
         blank=False,
     )
 
+    recipes_count = models.PositiveIntegerField(
+        'Recipes count',
+        default=0,
+        editable=False,
+    )
+
+    followers_count = models.PositiveIntegerField(
+        'Followers count',
+        default=0,
+        editable=False,
+    )
+
+    objects = UserManager()
+
+    counter_fields = ('recipes_count', 'followers_count')
+
     class Meta:
         ordering = ('username',)
         verbose_name = 'User'
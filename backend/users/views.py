@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -6,6 +7,7 @@ from rest_framework.permissions import (IsAuthenticated,
 from rest_framework.response import Response
 
 from api.serializers import CreateSubscribtionSerializer, SubscriberSerializer
+from recipes.models import Recipe
 from users.models import User
 from utils.paginations import CustomPagination
 
@@ -15,6 +17,11 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    cursor_ordering = ('username',)
+
+    def get_queryset(self):
+        return super().get_queryset().with_subscription_flag(
+            self.request.user)
 
     def get_permissions(self):
         if self.action == 'me':
@@ -25,14 +32,13 @@ class CustomUserViewSet(UserViewSet):
             detail=True,
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
-        author = User.objects.filter(id=id)
-        if not author.exists():
+        author = User.objects.filter(id=id).first()
+        if author is None:
             return Response({'error': 'no such author'},
                             status=status.HTTP_404_NOT_FOUND)
 
         serializer = CreateSubscribtionSerializer(
-            data={'user': request.user.id, 'author': id},
-            context={'request': request})
+            data={}, context={'request': request, 'author': author})
 
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -41,17 +47,13 @@ class CustomUserViewSet(UserViewSet):
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id=None):
-        author = User.objects.filter(id=id)
-        if not author.exists():
-            return Response({'error': 'no such author'},
-                            status=status.HTTP_404_NOT_FOUND)
-
-        subscription = self.request.user.followed_users.filter(author=id)
-
-        if subscription.exists():
-            subscription.delete()
+        deleted, _ = request.user.followed_users.filter(author=id).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        if not User.objects.filter(id=id).exists():
+            return Response({'error': 'no such author'},
+                            status=status.HTTP_404_NOT_FOUND)
         return Response(
             {'error': 'no such subscribe'},
             status=status.HTTP_400_BAD_REQUEST)
@@ -60,8 +62,18 @@ class CustomUserViewSet(UserViewSet):
             detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
+        recipes_limit = request.query_params.get('recipes_limit', '')
+        recipes_limit = int(recipes_limit) if recipes_limit.isdigit() else None
         subscriptions = User.objects.filter(
-            author__user=request.user)
+            author__user=request.user,
+        ).with_subscription_flag(request.user).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.only(
+                'id', 'name', 'cooking_time', 'image', 'renditions',
+                'author_id',
+            ).latest_per_author(recipes_limit),
+            to_attr='latest_recipes',
+        ))
         page = self.paginate_queryset(subscriptions)
         serializer = SubscriberSerializer(
             page, many=True, context={'request': request})
@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    """Return the current value of a cache version counter.
+
+    A missing counter is seeded from the clock, so a counter that was
+    evicted never goes back to a value that old entries were keyed on.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(keys):
+    """Return many version counters in one round trip, seeding the missing."""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        seed = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, seed, timeout=None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def bump_version(key):
+    """Invalidate everything keyed on the counter in O(1).
+
+    Writers bump once their transaction commits: bumped earlier, a read
+    running meanwhile would cache the old data under the new version.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key)
@@ -1,6 +1,25 @@
-from django_filters.rest_framework import FilterSet, filters
+from django import forms
+from django.db.models import Exists, OuterRef
+from django_filters.rest_framework import (DjangoFilterBackend, FilterSet,
+                                           filters)
+from django_filters.utils import translate_validation
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.catalog import get_tag_ids
+from recipes.feed import subscribed_recipes
+from recipes.models import Ingredient, Recipe
+from recipes.ranking import HALF_LIVES, order_by_score
+from recipes.recipe_index import RankedRecipes, rank_by_ingredients
+from recipes.search import search_recipes
+
+
+class IntegerInFilter(filters.BaseInFilter, filters.Filter):
+
+    field_class = forms.IntegerField
+
+
+class RegexFilter(filters.CharFilter):
+
+    field_class = forms.RegexField
 
 
 class IngredientFilter(FilterSet):
@@ -14,15 +33,25 @@ class IngredientFilter(FilterSet):
 
 class RecipeFilter(FilterSet):
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        method='filter_tags',
+        choices=lambda: [(slug, slug) for slug in get_tag_ids()],
     )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    subscribed = filters.BooleanFilter(method='filter_subscribed')
+    ingredients = IntegerInFilter(method='filter_ingredients')
+    match = RegexFilter(
+        method='filter_match',
+        regex=r'^(all|any|min:[1-9]\d*)$',
+    )
+    ordering = filters.ChoiceFilter(
+        method='filter_ordering',
+        choices=[(score, score) for score in HALF_LIVES],
+    )
 
     class Meta:
         model = Recipe
@@ -31,8 +60,26 @@ class RecipeFilter(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
+            'subscribed',
+            'ingredients',
+            'match',
+            'ordering',
         )
 
+    def __init__(self, *args, rank_in_memory=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rank_in_memory = rank_in_memory
+        self.ranking = None
+
+    @property
+    def ranked_qs(self):
+        """``qs``, wrapped in ``RankedRecipes`` when ranked in memory."""
+        queryset = self.qs
+        if self.rank_in_memory and self.ranking is not None:
+            return RankedRecipes(queryset, self.ranking)
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
 
         if value and self.request.user.is_authenticated:
@@ -46,3 +93,52 @@ class RecipeFilter(FilterSet):
             return queryset.filter(
                 recipes_shoppingcart_related__user=self.request.user)
         return queryset
+
+    def filter_tags(self, queryset, name, value):
+        # EXISTS keeps one row per recipe, so no DISTINCT is needed.
+        if not value:
+            return queryset
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value])))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_subscribed(self, queryset, name, value):
+        if value and self.request.user.is_authenticated:
+            return queryset.filter(subscribed_recipes(self.request.user))
+        return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        self.ranking = rank_by_ingredients(
+            value, self.form.cleaned_data.get('match') or 'all')
+        if self.rank_in_memory:
+            # Applied by ranked_qs, a page at a time.
+            return queryset
+        return queryset.filter(pk__in=self.ranking)
+
+    def filter_match(self, queryset, name, value):
+        # Read by filter_ingredients.
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        return order_by_score(queryset, value)
+
+
+class RecipeFilterBackend(DjangoFilterBackend):
+    """Return ``RecipeFilter.ranked_qs`` to views with ``rank_in_memory``."""
+
+    def get_filterset_kwargs(self, request, queryset, view):
+        kwargs = super().get_filterset_kwargs(request, queryset, view)
+        kwargs['rank_in_memory'] = getattr(view, 'rank_in_memory', False)
+        return kwargs
+
+    def filter_queryset(self, request, queryset, view):
+        filterset = self.get_filterset(request, queryset, view)
+        if filterset is None:
+            return queryset
+        if not filterset.is_valid() and self.raise_exception:
+            raise translate_validation(filterset.errors)
+        return filterset.ranked_qs
@@ -0,0 +1,97 @@
+from hashlib import md5
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from recipes.catalog import get_catalog_state
+from utils.cache import get_version
+
+
+def query_digest(request):
+    """Hash the host, path and query string with params and values sorted."""
+    query = '&'.join(
+        f'{key}={value}'
+        for key, values in sorted(request.query_params.lists())
+        for value in sorted(values))
+    return md5(
+        f'{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+
+
+class CatalogCacheMixin:
+    """Conditional GET and versioned caching for read-only catalogs.
+
+    ``ETag`` and ``Last-Modified`` come from the catalog version counter,
+    so a revalidation is answered with 304 without a database query.
+    Serialized bodies are cached per version, path and query string.
+    """
+
+    authentication_classes = ()
+    catalog_cache_timeout = 60 * 60
+
+    def catalog_response(self, request, get_data):
+        model = self.queryset.model
+        version, modified = get_catalog_state(model)
+        etag = quote_etag(f'{model._meta.label_lower}-{version}')
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified)
+        if response is None:
+            cache_key = (f'catalog:{model._meta.label_lower}:{version}:'
+                         f'{query_digest(request)}')
+            data = cache.get(cache_key)
+            if data is None:
+                data = get_data()
+                cache.set(cache_key, data, self.catalog_cache_timeout)
+            response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        parent_list = super().list
+        return self.catalog_response(
+            request, lambda: parent_list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        parent_retrieve = super().retrieve
+        return self.catalog_response(
+            request, lambda: parent_retrieve(request, *args, **kwargs).data)
+
+
+def anonymous_list_cache_key(request, generation_key):
+    generation = get_version(generation_key)
+    return f'{generation_key}:{generation}:{query_digest(request)}'
+
+
+class AnonymousListCacheMixin:
+    """Cache list responses served to anonymous users.
+
+    Entries are keyed on the generation counter named by
+    ``list_generation_key``; bumping it drops every cached page at once.
+    """
+
+    list_generation_key = None
+    list_cache_timeout = 60 * 5
+
+    def list(self, request, *args, **kwargs):
+        parent_list = super().list
+        return self.anonymous_list_response(
+            request, lambda: parent_list(request, *args, **kwargs))
+
+    def anonymous_list_response(self, request, get_response):
+        if request.user.is_authenticated:
+            return get_response()
+
+        cache_key = anonymous_list_cache_key(
+            request, self.list_generation_key)
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = get_response()
+        if response.status_code == 200:
+            cache.set(cache_key, response.data, self.list_cache_timeout)
+        return response
@@ -0,0 +1,37 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+class CounterFieldsMixin:
+    """Keep denormalized counters out of regular ``save()`` calls.
+
+    Counters are changed with ``F()`` updates elsewhere, so a full save of
+    an instance loaded earlier must not write its stale copy back.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+def adjust_counter(queryset, field, delta):
+    """Atomically add ``delta`` to a counter, never going below zero."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def related_count(related_model, related_field):
+    """Subquery counting ``related_model`` rows pointing at the outer row."""
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{related_field: OuterRef('pk')})
+        .order_by()
+        .values(related_field)
+        .annotate(count=Count('pk'))
+        .values('count')), 0)
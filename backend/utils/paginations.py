@@ -1,5 +1,124 @@
-from rest_framework.pagination import PageNumberPagination
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+COUNT_CACHE_TIMEOUT = 30
+RELTUPLES_THRESHOLD = 100000
+
+
+class CountingPaginator(Paginator):
+
+    def __init__(self, *args, count_function, **kwargs):
+        self.count_function = count_function
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        return self.count_function(self.object_list)
+
+
+class LimitCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
 
 
 class CustomPagination(PageNumberPagination):
+    """Page numbers by default, keyset pagination with ``?cursor=``.
+
+    Cursor mode is opt-in for views declaring ``cursor_ordering``. It seeks
+    on the ordering columns instead of counting and skipping rows, so deep
+    pages cost the same as the first one and no total count is returned.
+
+    In page mode the total is estimated unless ``?exact_count=1`` is
+    passed: unfiltered lists of large PostgreSQL tables use the planner's
+    ``reltuples``, everything else an exact count. Either is cached for a
+    few seconds per filter set. ``is_estimate`` tells whether the total
+    may be off.
+    """
+
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    exact_count_query_param = 'exact_count'
+    ignored_count_params = ('page', 'limit', 'cursor', 'exact_count')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering and self.cursor_query_param in request.query_params:
+            self.cursor_paginator = LimitCursorPagination()
+            self.cursor_paginator.ordering = ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+
+        self.is_estimate = False
+        self.django_paginator_class = partial(
+            CountingPaginator,
+            count_function=partial(self.count_objects, request))
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return Response({
+            'count': self.page.paginator.count,
+            'is_estimate': self.is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['is_estimate'] = {'type': 'boolean'}
+        return schema
+
+    def count_objects(self, request, queryset):
+        if not isinstance(queryset, QuerySet):
+            # Ranked id lists know their length.
+            return len(queryset)
+        if request.query_params.get(self.exact_count_query_param) == '1':
+            return queryset.count()
+
+        key = self.count_cache_key(request)
+        count = cache.get(key)
+        if count is not None:
+            self.is_estimate = True
+            return count
+        count = self.estimate_table_size(queryset)
+        if count is not None:
+            self.is_estimate = True
+        else:
+            count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    @staticmethod
+    def estimate_table_size(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row is None or row[0] < RELTUPLES_THRESHOLD:
+            return None
+        return row[0]
+
+    def count_cache_key(self, request):
+        params = '&'.join(
+            f'{key}={value}'
+            for key, values in sorted(request.query_params.lists())
+            if key not in self.ignored_count_params
+            for value in values)
+        user = request.user.pk if request.user.is_authenticated else ''
+        digest = md5(f'{request.path}?{params}:{user}'.encode()).hexdigest()
+        return f'pagination_count:{digest}'
@@ -0,0 +1,178 @@
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Reduce a statement to its shape, dropping literals and IN-list sizes."""
+    sql = sql.replace('%s', '?')
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook counting and timing every statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+class ProfileBuffer:
+    """Bounded, thread-safe store of the most recent request profiles."""
+
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=size)
+
+    def append(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def snapshot(self):
+        with self._lock:
+            return list(reversed(self._records))
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+def attach(recorder):
+    connections['default'].execute_wrappers.append(recorder)
+
+
+def detach(recorder):
+    connections['default'].execute_wrappers.remove(recorder)
+
+
+profile_buffer = ProfileBuffer(getattr(settings, 'SQL_PROFILING_BUFFER', 200))
+
+
+class SQLProfilingMiddleware:
+    """Record query count, DB time and N+1 suspects per request.
+
+    Off unless ``SQL_PROFILING`` is set; ``SQL_PROFILING_SAMPLE_RATE``
+    profiles only that share of requests. With ``DEBUG`` on, the totals
+    are also returned in ``X-DB-Queries`` and ``X-DB-Time`` headers.
+
+    When off it drops out of the chain, and it runs in whichever mode
+    the next handler has, so it never makes the ASGI chain fall back
+    to sync.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SQL_PROFILING_SAMPLE_RATE', 1.0)
+        self.threshold = getattr(settings, 'SQL_PROFILING_N_PLUS_ONE', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        # Connections are per thread, and the request's queries run on
+        # the thread sync_to_async keeps for it, so the hook goes there.
+        await sync_to_async(attach)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(detach)(recorder)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        if response.streaming:
+            # The body runs its queries while being consumed, so the
+            # profile is stored once the stream is exhausted.
+            profile_stream = (
+                self.aprofile_stream if response.is_async
+                else self.profile_stream)
+            response.streaming_content = profile_stream(
+                response.streaming_content, request, response,
+                recorder, start)
+            return response
+
+        self.store(request, response, recorder, start)
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time'] = f'{recorder.duration * 1000:.2f}'
+        return response
+
+    def profile_stream(self, content, request, response, recorder, start):
+        try:
+            with connections['default'].execute_wrapper(recorder):
+                yield from content
+        finally:
+            self.store(request, response, recorder, start)
+
+    async def aprofile_stream(self, content, request, response, recorder,
+                              start):
+        await sync_to_async(attach)(recorder)
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            await sync_to_async(detach)(recorder)
+            self.store(request, response, recorder, start)
+
+    def store(self, request, response, recorder, start):
+        profile_buffer.append({
+            'timestamp': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+            'queries': recorder.count,
+            'db_time_ms': round(recorder.duration * 1000, 2),
+            'suspected_n_plus_one': [
+                {'fingerprint': sql, 'count': count}
+                for sql, count in recorder.fingerprints.most_common()
+                if count >= self.threshold
+            ],
+        })